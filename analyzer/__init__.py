@@ -0,0 +1,18 @@
+"""Moteur d'analyse Excel Analyzer Pro, utilisable sans Streamlit (application, CLI, traitements batch)"""
+from .data import clean_data, derive, visible, ok_mask, date_col, counts, memory_report, parse_dates, file_hash
+from .search import parse_nl_query, fuzzy_search, calc_score, calc_scores, get_suggestions, ContractIndex, QueryIndex
+from .metrics import agency_metrics, agency_table, temporal_metrics
+from .excel import create_excel, excel_sheets, EXCEL_SHEETS
+from .reader import read_workbook, ANALYSIS_COLS
+from .snapshot import SnapshotStore
+from .reconcile import reconcile, normalize_key, Reconciliation, FUZZY_THRESHOLD, SIDES
+from .blocking import BlockingConfig, BlockingIndex, fuzzy_join, all_matches
+from .parallel import map_chunks, PARALLEL_WORKERS, PARALLEL_CHUNK
+from .incremental import Aggregates, merge_delta, concat_clean
+from .charts import chart_data, downsample, CHARTS, MAX_POINTS
+from .cube import CountCube
+from .export import iter_frames, csv_chunks, parquet_chunks, xlsx_chunks, export_chunks, spool, report_bundle, EXPORT_FORMATS
+from .profiling import Profiler, stage, rss_mb, memory_tracing, PROFILE_ENABLED, PROFILE_MEMORY
+from .clustering import MessageClusters, message_templates, near_duplicates
+from .jobs import JobRunner, Job, JobCancelled, JOB_WORKERS, PENDING, RUNNING, DONE, CANCELLED, FAILED
+from .registry import DatasetRegistry, nbytes, REGISTRY_MAX_BYTES, SESSION_TTL
@@ -0,0 +1,142 @@
+"""Benchmarks : python -m analyzer.bench suite [--tailles N ...] [-o resultats.json] [--comparer base.json]
+                  python -m analyzer.bench blocking [-n N ...] [-j PROCESSUS ...]"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .blocking import benchmark as bench_blocking
+from .clustering import MessageClusters
+from .data import clean_data
+from .excel import create_excel
+from .export import report_bundle
+from .incremental import Aggregates
+from .metrics import agency_metrics
+from .profiling import Profiler, memory_tracing
+from .search import parse_nl_query, calc_scores, fuzzy_search, get_suggestions, ContractIndex, QueryIndex
+
+SIZES = [10_000, 100_000, 1_000_000]
+STATUTS = (['OK', 'KO', 'Rejet', 'Erreur', 'En attente'], [0.7, 0.12, 0.1, 0.05, 0.03])
+TYPES = ['CDD', 'Intérim', 'Mission', 'CDI Intérimaire', 'Contrat de professionnalisation']
+MESSAGES = ["Contrat {n} rejeté le {d}/{m}/2025", "Salarié {n} inconnu dans Pixid",
+            "Date de début {d}/{m}/2025 antérieure à la date de commande", "Taux horaire {d},{m} € inférieur au minimum",
+            "Champ obligatoire manquant : qualification", "Doublon du contrat {n}"]
+
+def synthetic_dataset(n, agences=40, contrats=None, ko_rate=None, jours=300, seed=0):
+    """Jeu de données brut au format Pixid (tel que lu par read_workbook).
+    agences : nombre d'agences ; contrats : nombre de contrats distincts (défaut n, tous différents) ;
+    ko_rate : part des statuts non OK (défaut : répartition STATUTS) ; jours : étendue des dates d'intégration"""
+    rng = np.random.default_rng(seed)
+    statuts, p = STATUTS
+    if ko_rate is not None: p = [1 - ko_rate] + [ko_rate * x / sum(p[1:]) for x in p[1:]]
+    st = rng.choice(statuts, n, p=p)
+    ids = rng.choice(90_000_000, contrats or n, replace=False) + 10_000_000
+    contrat = np.char.add('C', (ids[rng.integers(0, len(ids), n)] if contrats else ids).astype(str)).astype(object)
+    dates = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, jours * 86400, n), unit='s')
+    tpl, num, d, m = rng.integers(0, len(MESSAGES), n), rng.integers(1000, 99999, n), rng.integers(1, 29, n), rng.integers(1, 13, n)
+    ko = st != 'OK'
+    msg = np.full(n, None, dtype=object)
+    msg[ko] = [MESSAGES[t].format(n=a, d=b, m=c) for t, a, b, c in zip(tpl[ko], num[ko], d[ko], m[ko])]
+    return pd.DataFrame({'Contrat': contrat, 'Code_Unite': np.char.add('AG', np.char.zfill(rng.integers(0, agences, n).astype(str), 3)).astype(object),
+                         'Statut_Final': st.astype(object), 'Initial/Avenant': rng.choice(['Initial', 'Avenant'], n, p=[0.6, 0.4]).astype(object),
+                         'Type (libellé)': rng.choice(TYPES, n).astype(object), 'Date_Integration': dates.strftime('%Y-%m-%d %H:%M:%S').astype(object),
+                         'Message_Integration': msg})
+
+def _stages(raw, excel=True):
+    """Étapes mesurées : (nom, fonction) ; chaque fonction reçoit l'état des étapes précédentes"""
+    def hybride(s):
+        f = parse_nl_query('ko ag001 mars c12', s['df'])
+        sub = s['df'].iloc[s['qi'].rows(f)]
+        return calc_scores(sub, 'ko ag001 mars c12', f)
+    out = [('clean_data', lambda s: s.update(df=clean_data(raw.copy()))),
+           ('index_contrats', lambda s: s.update(ci=ContractIndex(s['df']))),
+           ('index_requetes', lambda s: s.update(qi=QueryIndex(s['df']))),
+           ('suggestions', lambda s: get_suggestions('C123', s['df'], index=s['ci'])),
+           ('recherche_hybride', hybride),
+           ('recherche_exacte', lambda s: s['qi'].contains('c12')),
+           ('recherche_floue', lambda s: fuzzy_search('C1234567', s['df'], 'Contrat', 50, index=s['ci'])),
+           ('agregation_agences', lambda s: agency_metrics(s['df'])),
+           ('agregats_additifs', lambda s: Aggregates.from_frame(s['df'])),
+           ('causes_erreurs', lambda s: MessageClusters.from_frame(s['df']))]
+    out += [('rapport_selectif', lambda s: create_excel(s['df'], sheets=['Analyse par agence', 'Contrats KO'])),
+            ('rapport_lien_parquet', lambda s: report_bundle(s['df']).read())]
+    if excel: out.append(('create_excel', lambda s: create_excel(s['df'])))
+    return out
+
+def run_suite(sizes=SIZES, memory=False, excel=True, seed=0, log=print):
+    """Mesure chaque étape à chaque taille ; renvoie une liste d'enregistrements (lignes, étape, durée, mémoire)"""
+    results = []
+    started = memory and memory_tracing()
+    try:
+        for n in sizes:
+            raw = synthetic_dataset(n, seed=seed)
+            state, prof = {}, Profiler(True)
+            for name, fn in _stages(raw, excel):
+                with prof.stage(name): fn(state)
+                rec = {'lignes': n, **prof.records[-1]}
+                results.append(rec)
+                log(f"{n:>9,} {name:<20} {rec['duree_ms']:>11,.1f} ms  RSS {rec['rss_mo']:>8,.1f} Mo"
+                    + (f"  pic {rec['pic_alloc_mo']:,.1f} Mo" if 'pic_alloc_mo' in rec else ''))
+    finally:
+        # Le CLI arrête ce qu'il a lui-même démarré
+        if started: tracemalloc.stop()
+    return results
+
+def _meta():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'pandas': pd.__version__, 'numpy': np.__version__, 'cpu': os.cpu_count(), 'machine': platform.machine()}
+
+def compare(results, base):
+    """Rapport durée actuelle / durée de référence pour chaque (taille, étape) commune"""
+    ref = {(r['lignes'], r['etape']): r['duree_ms'] for r in base}
+    return [{'lignes': r['lignes'], 'etape': r['etape'], 'ref_ms': ref[(r['lignes'], r['etape'])], 'duree_ms': r['duree_ms'],
+             'ratio': round(r['duree_ms'] / ref[(r['lignes'], r['etape'])], 2) if ref[(r['lignes'], r['etape'])] else None}
+            for r in results if (r['lignes'], r['etape']) in ref]
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog='python -m analyzer.bench', description="Benchmarks du moteur d'analyse")
+    sub = p.add_subparsers(dest='cmd', required=True)
+    s = sub.add_parser('suite', help="Étapes du pipeline (nettoyage, recherches, agrégats, export) sur données synthétiques")
+    s.add_argument('--tailles', type=int, nargs='+', default=SIZES, help="Nombres de lignes (défaut : 10k 100k 1M)")
+    s.add_argument('--memoire', action='store_true', help="Pic d'allocation par étape (tracemalloc : durées gonflées, à mesurer séparément)")
+    s.add_argument('--sans-excel', action='store_true', help="Ne pas mesurer create_excel")
+    s.add_argument('-o', '--output', help="Fichier JSON de résultats")
+    s.add_argument('--comparer', help="Fichier JSON de référence (résultats d'une version précédente)")
+    b = sub.add_parser('blocking', help="Appariement flou par blocage contre la force brute")
+    b.add_argument('-n', type=int, nargs='+', default=[1000, 5000, 20000], help="Tailles à tester (n×n paires)")
+    b.add_argument('--seuil', type=int, default=90)
+    b.add_argument('-q', type=int, default=3)
+    b.add_argument('--prefixe', type=int, default=0, help="Longueur du blocage par préfixe (0 = désactivé)")
+    b.add_argument('--sans-force-brute', action='store_true', help="Ne pas calculer la référence exhaustive")
+    b.add_argument('-j', '--jobs', type=int, nargs='+', default=[None], help="Nombre(s) de processus à comparer (1 = série)")
+    args = p.parse_args(argv)
+    if args.cmd == 'blocking':
+        for n in args.n:
+            for j in args.jobs:
+                print(bench_blocking(n, args.seuil, args.q, args.prefixe, not args.sans_force_brute, workers=j), flush=True)
+        return 0
+    results = run_suite(args.tailles, args.memoire, not args.sans_excel, log=lambda m: print(m, flush=True))
+    out = {'meta': {**_meta(), 'memoire': args.memoire}, 'resultats': results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(out, indent=1, ensure_ascii=False), encoding='utf-8')
+    if args.comparer:
+        base = json.loads(Path(args.comparer).read_text(encoding='utf-8'))['resultats']
+        for c in compare(results, base):
+            print(f"{c['lignes']:>9,} {c['etape']:<20} {c['ref_ms']:>10,.1f} -> {c['duree_ms']:>10,.1f} ms  x{c['ratio']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
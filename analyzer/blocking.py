@@ -0,0 +1,173 @@
+"""Blocage et élagage des candidats pour l'appariement flou de numéros de contrat à grande échelle.
+
+Pour un seuil t de fuzz.ratio (similarité Indel), un score est retenu dès qu'il s'arrondit à t : les bornes
+utilisent donc le seuil effectif te = t - 0,5. Une paire n'est scorée que si elle passe :
+- le blocage par q-grammes (index inversé) avec le filtre de comptage : au moins
+  max(l1, l2) - q + 1 - q*D q-grammes communs, où D = (l1 + l2)*(1 - te/100) (si cette borne est <= 0,
+  toutes les clés de la longueur concernée sont candidates, même sans q-gramme commun) ;
+- le filtre de longueur : 200*min(l1, l2)/(l1 + l2) >= te ;
+- la borne par histogramme de caractères : 100*(1 - Σ|h1 - h2|/(l1 + l2)) >= te ;
+- optionnellement un blocage par préfixe (plus rapide, mais le rappel n'est plus garanti).
+Les trois premiers filtres sont des bornes supérieures exactes : le rappel est celui de la force brute."""
+import time
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+
+from .parallel import map_chunks, worker_state
+
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# Part de l'index exemptée du filtre de comptage au-delà de laquelle toutes les clés sont scorées directement
+# (seuils bas : le filtrage coûterait plus cher que le score rapidfuzz lui-même)
+FULL_SCAN_RATIO = 0.5
+_CHAR_IDX = {c: i for i, c in enumerate(ALPHABET)}
+
+class BlockingConfig:
+    """Paramètres de l'appariement flou : seuil, taille des q-grammes, blocage par préfixe (0 = désactivé)"""
+    def __init__(self, threshold=90, q=3, prefix_len=0, char_filter=True):
+        self.threshold = threshold
+        self.q = q
+        self.prefix_len = prefix_len
+        self.char_filter = char_filter
+
+def _histograms(keys):
+    h = np.zeros((len(keys), len(ALPHABET) + 1), dtype=np.int16)
+    for i, k in enumerate(keys):
+        for c in k:
+            h[i, _CHAR_IDX.get(c, len(ALPHABET))] += 1
+    return h
+
+def _qgram_index(keys, q):
+    """q-gramme -> identifiants des clés qui le contiennent (avec répétition)"""
+    index = {}
+    for i, k in enumerate(keys):
+        for j in range(len(k) - q + 1):
+            index.setdefault(k[j:j+q], []).append(i)
+    return {g: np.array(ids, dtype=np.int64) for g, ids in index.items()}
+
+class BlockingIndex:
+    """Index des clés de droite, construit une fois et interrogé pour chaque clé de gauche"""
+    def __init__(self, keys, cfg=None):
+        self.cfg = cfg or BlockingConfig()
+        self.keys = list(keys)
+        self.lens = np.array([len(k) for k in self.keys], dtype=np.int64)
+        self.grams = _qgram_index(self.keys, self.cfg.q)
+        self.hist = _histograms(self.keys) if self.cfg.char_filter else None
+        self.prefix = np.array([k[:self.cfg.prefix_len] for k in self.keys], dtype=object) if self.cfg.prefix_len else None
+        # Clés regroupées par longueur : candidates d'office quand le filtre de comptage n'exige aucun q-gramme commun
+        self.len_values, len_codes = np.unique(self.lens, return_inverse=True)
+        order = np.argsort(len_codes, kind='stable')
+        self.len_ids = np.split(order, np.cumsum(np.bincount(len_codes, minlength=len(self.len_values)))[:-1])
+        self.all_ids = np.arange(len(self.keys))
+
+    def candidates(self, key, stats=None):
+        """Identifiants des clés de droite dont la similarité avec key peut atteindre le seuil"""
+        # Seuil effectif : matches() garde les scores arrondis à t, soit tout score >= t - 0,5
+        cfg, t, q, ll = self.cfg, self.cfg.threshold - 0.5, self.cfg.q, len(key)
+        # Longueurs pour lesquelles le filtre de comptage n'exige rien (borne <= 0, ou clés trop courtes pour
+        # avoir un q-gramme) : ces clés peuvent convenir sans q-gramme commun, elles sont ajoutées sans ce filtre
+        lv = self.len_values
+        free = ((np.maximum(ll, lv) - q + 1 - q * np.floor((ll + lv) * (100 - t) / 100 + 1e-9) <= 0) | (lv < q)) \
+               & (200 * np.minimum(ll, lv) >= t * (ll + lv))
+        if self.prefix is None and sum(len(self.len_ids[i]) for i in np.flatnonzero(free)) >= FULL_SCAN_RATIO * len(self.keys):
+            if stats is not None:
+                stats['apres_qgrammes'] += len(self.keys)
+                stats['scorees'] += len(self.keys)
+            return self.all_ids
+        lists = [self.grams[g] for g in {key[j:j+q] for j in range(ll - q + 1)} if g in self.grams]
+        if lists:
+            ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        else:
+            ids, shared = np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        if free.any():
+            extra = np.setdiff1d(np.concatenate([self.len_ids[i] for i in np.flatnonzero(free)]), ids)
+            ids, shared = np.concatenate([ids, extra]), np.concatenate([shared, np.full(len(extra), 1 << 30)])
+        lr = self.lens[ids]
+        d = np.floor((ll + lr) * (100 - t) / 100 + 1e-9)
+        keep = (shared >= np.maximum(ll, lr) - q + 1 - q * d) & (200 * np.minimum(ll, lr) >= t * (ll + lr))
+        if stats is not None: stats['apres_qgrammes'] += int(keep.sum())
+        ids, lr = ids[keep], lr[keep]
+        if self.prefix is not None and len(ids):
+            ids = ids[self.prefix[ids] == key[:cfg.prefix_len]]
+            lr = self.lens[ids]
+        if self.hist is not None and len(ids):
+            diff = np.abs(self.hist[ids] - _histograms([key])[0]).sum(axis=1)
+            ids = ids[100 * (ll + lr - diff) >= t * (ll + lr)]
+        if stats is not None: stats['scorees'] += len(ids)
+        return ids
+
+    def matches(self, key, stats=None):
+        """Clés de droite atteignant le seuil : [(identifiant, score brut)] du meilleur au moins bon (à égalité, ordre d'index)"""
+        ids = self.candidates(key, stats)
+        if not len(ids): return []
+        choices = self.keys if ids is self.all_ids else [self.keys[i] for i in ids]
+        found = rf_process.extract(key, choices, scorer=rf_fuzz.ratio,
+                                   score_cutoff=self.cfg.threshold - 0.5, limit=None)
+        found = sorted((m for m in found if round(m[1]) >= self.cfg.threshold), key=lambda m: (-m[1], m[2]))
+        return [(int(ids[m[2]]), m[1]) for m in found]
+
+def _matches_chunk(keys):
+    index = worker_state()['index']
+    stats = {'apres_qgrammes': 0, 'scorees': 0}
+    return [index.matches(k, stats) for k in keys], stats
+
+def all_matches(left_keys, index, workers=None, chunk_size=None):
+    """index.matches pour chaque clé de gauche, réparti par lots sur un pool de processus ; renvoie (résultats, statistiques)"""
+    left_keys = list(left_keys)
+    stats = {'paires_totales': len(left_keys) * len(index.keys), 'apres_qgrammes': 0, 'scorees': 0}
+    out = []
+    for res, st in map_chunks(_matches_chunk, left_keys, {'index': index}, workers, chunk_size):
+        out.extend(res)
+        for k, v in st.items(): stats[k] += v
+    stats['elaguees_pct'] = round(100 * (1 - stats['scorees'] / stats['paires_totales']), 4) if stats['paires_totales'] else 0.0
+    return out, stats
+
+def fuzzy_join(left_keys, right_keys, cfg=None, index=None, workers=None, chunk_size=None):
+    """Meilleure correspondance (score fuzz.ratio arrondi >= seuil) de chaque clé de gauche parmi les clés de droite.
+    Renvoie (DataFrame gauche/droite/score, statistiques d'élagage)"""
+    cfg = cfg or BlockingConfig()
+    index = index or BlockingIndex(right_keys, cfg)
+    left_keys = list(left_keys)
+    res, stats = all_matches(left_keys, index, workers, chunk_size)
+    rows = [(k, index.keys[m[0][0]], int(round(m[0][1]))) for k, m in zip(left_keys, res) if m]
+    return pd.DataFrame(rows, columns=['gauche', 'droite', 'score']), stats
+
+def brute_force_join(left_keys, right_keys, threshold=90):
+    """Référence exhaustive (toutes les paires) pour mesurer le rappel"""
+    left_keys, right_keys = list(left_keys), list(right_keys)
+    scores = rf_process.cdist(left_keys, right_keys, scorer=rf_fuzz.ratio, workers=-1)
+    best = scores.argmax(axis=1)
+    top = np.rint(scores[np.arange(len(left_keys)), best])
+    ok = top >= threshold
+    return pd.DataFrame({'gauche': np.array(left_keys, dtype=object)[ok], 'droite': np.array(right_keys, dtype=object)[best[ok]], 'score': top[ok].astype(int)})
+
+def synthetic_keys(n, typo_rate=0.3, seed=0):
+    """Clés de contrat synthétiques : (gauche, droite) où une partie de la droite comporte une faute de frappe"""
+    rng = np.random.default_rng(seed)
+    left = [f"C{x}" for x in rng.choice(10**8, n, replace=False)]
+    right = []
+    for k in left:
+        if rng.random() < typo_rate:
+            i = int(rng.integers(1, len(k)))
+            op = rng.integers(3)
+            k = k[:i] + str(rng.integers(10)) + k[i+1:] if op == 0 else k[:i] + k[i+1:] if op == 1 else k[:i] + str(rng.integers(10)) + k[i:]
+        right.append(k)
+    rng.shuffle(right)
+    return left, right
+
+def benchmark(n=5000, threshold=90, q=3, prefix_len=0, brute=True, seed=0, workers=None):
+    """Compare l'appariement par blocage à la force brute : temps, paires élaguées et rappel"""
+    left, right = synthetic_keys(n, seed=seed)
+    cfg = BlockingConfig(threshold, q, prefix_len)
+    t0 = time.perf_counter()
+    res, stats = fuzzy_join(left, right, cfg, workers=workers)
+    out = {'n': n, 'seuil': threshold, 'q': q, 'prefixe': prefix_len, 'processus': workers, 'temps_blocage_s': round(time.perf_counter() - t0, 3), **stats,
+           'appariements': len(res)}
+    if brute:
+        t0 = time.perf_counter()
+        ref = brute_force_join(left, right, threshold)
+        out['temps_force_brute_s'] = round(time.perf_counter() - t0, 3)
+        found = set(res['gauche'])
+        out['rappel'] = round(sum(k in found for k in ref['gauche']) / len(ref), 4) if len(ref) else 1.0
+    return out
@@ -0,0 +1,52 @@
+"""Données des graphiques : petites tables calculées à partir des agrégats, prêtes pour Plotly"""
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 1500
+
+def downsample(df, x, y, max_points=MAX_POINTS):
+    """Réduit une série longue à ~max_points points en gardant le min et le max de chaque tranche (pics préservés)"""
+    n = len(df)
+    if n <= max_points: return df
+    buckets = np.arange(n) * (max_points // 2) // n
+    v = df[y].to_numpy()
+    s = pd.Series(v)
+    keep = np.union1d(s.groupby(buckets).idxmin().to_numpy(), s.groupby(buckets).idxmax().to_numpy())
+    return df.iloc[np.union1d(keep, [0, n-1])]
+
+def status_split(agg):
+    return pd.Series({'OK': agg.ok, 'KO': agg.ko})
+
+def top_counts(agg, col, n=None):
+    vc = agg.counts(col)
+    return vc.head(n) if n else vc
+
+def top_success(agg, n=15):
+    return agg.agency_metrics(1).set_index('Agence')['Taux'].sort_values(ascending=False).head(n)
+
+def timeline(agg, max_points=MAX_POINTS):
+    return downsample(agg.temporal()[0], 'Date', 'Nombre', max_points)
+
+def cross_counts(agg, a, b, ko_only=False):
+    ct = agg.crosstab(a, b, ko_only)
+    return ct.loc[:, ct.sum() > 0]
+
+def ko_heatmap(agg, n=10):
+    """Croisement agences × statuts KO, limité aux n agences ayant le plus de KO"""
+    ct = agg.crosstab('Code_Unite', 'Statut_Final', ko_only=True)
+    top = ct.sum(axis=1).sort_values(ascending=False, kind='stable').head(n).index
+    ct = ct.loc[ct.index.isin(top)]
+    return ct.loc[:, ct.sum() > 0]
+
+def dashboard_table(agg, agences=(), seuil=0, tri='Taux'):
+    """Tableau du dashboard pour un état de filtres : agences sélectionnées, taux minimum, tri"""
+    ag = agg.agency_metrics(1).sort_values('Taux', ascending=False)
+    if agences: ag = ag[ag['Agence'].isin(agences)]
+    return ag[ag['Taux'] >= seuil].sort_values(tri, ascending=False)
+
+CHARTS = {'statuts': status_split, 'comptages': top_counts, 'taux_agences': top_success, 'timeline': timeline,
+          'croisement': cross_counts, 'heatmap_ko': ko_heatmap, 'agences': dashboard_table}
+
+def chart_data(agg, name, **params):
+    """Table d'entrée du graphique name, calculée à partir des agrégats du jeu de données"""
+    return CHARTS[name](agg, **params)
@@ -0,0 +1,60 @@
+"""Génération batch des rapports Excel : python -m analyzer DOSSIER [-o SORTIE] [-j PROCESSUS]"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from .data import clean_data
+from .excel import create_excel
+from .reader import read_workbook, ANALYSIS_COLS
+
+def process_file(path, out_dir, columns=None, sheet_workers=None):
+    """Lit, nettoie et exporte un classeur ; renvoie (nom, lignes, secondes, erreur).
+    sheet_workers : threads de construction des onglets (voir excel_sheets)"""
+    t0 = time.perf_counter()
+    try:
+        df = clean_data(read_workbook(Path(path).read_bytes(), columns, name=path))
+        out = Path(out_dir) / f"{Path(path).stem}_analyse.xlsx"
+        out.write_bytes(create_excel(df, workers=sheet_workers).getvalue())
+        return Path(path).name, len(df), time.perf_counter() - t0, None
+    except Exception as e:
+        return Path(path).name, 0, time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+
+def run(files, out_dir, workers=None, columns=None):
+    """Traite les fichiers en parallèle ; affiche les temps par fichier et le débit global"""
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    results = []
+    # Les processus occupent déjà les cœurs : pas de threads d'onglets en plus dans chacun
+    sheet_workers = 1 if (workers or os.cpu_count() or 1) > 1 else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_file, f, out_dir, columns, sheet_workers) for f in files]
+        for fut in as_completed(futures):
+            name, rows, secs, err = fut.result()
+            results.append((name, rows, secs, err))
+            print(f"{'❌' if err else '✅'} {name}: {rows} lignes en {secs:.2f}s" + (f" ({err})" if err else ""), flush=True)
+    total = time.perf_counter() - t0
+    rows = sum(r[1] for r in results)
+    ok = sum(1 for r in results if r[3] is None)
+    print(f"\n{ok}/{len(results)} rapport(s) en {total:.2f}s - {len(results)/total:.2f} fichier(s)/s, {rows/total:,.0f} lignes/s")
+    return results
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog='python -m analyzer', description="Génère le rapport Excel 7 onglets pour chaque classeur d'un dossier")
+    p.add_argument('input', help="Dossier contenant les classeurs Excel")
+    p.add_argument('-o', '--output', default='rapports', help="Dossier de sortie (défaut : rapports)")
+    p.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="Nombre de processus (défaut : nombre de cœurs)")
+    p.add_argument('--pattern', default='*.xls*', help="Motif des fichiers à traiter (défaut : *.xls*)")
+    p.add_argument('--analysis-columns', action='store_true', help="Ne lire que les colonnes utilisées par les analyses")
+    args = p.parse_args(argv)
+    files = sorted(f for f in Path(args.input).glob(args.pattern) if not f.name.startswith('~$'))
+    if not files:
+        print(f"Aucun fichier '{args.pattern}' dans {args.input}", file=sys.stderr)
+        return 1
+    results = run(files, args.output, args.jobs, ANALYSIS_COLS if args.analysis_columns else None)
+    return 0 if all(r[3] is None for r in results) else 2
+
+if __name__ == '__main__':
+    sys.exit(main())
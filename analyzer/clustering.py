@@ -0,0 +1,142 @@
+"""Causes d'erreur : regroupement des Message_Integration.
+Chaque message distinct est ramené à un gabarit (dates, nombres, identifiants masqués), les gabarits identiques sont
+fusionnés par hachage, puis les gabarits proches sont regroupés par MinHash + LSH (sans comparaison de toutes les paires).
+Le travail porte sur les messages distincts pondérés par leurs comptages, pas sur les lignes"""
+import numpy as np
+import pandas as pd
+
+from .data import ok_mask
+
+# (expression, jeton) appliqués dans l'ordre
+MASKS = [
+    (r'"[^"]*"|«[^»]*»', '<TXT>'),
+    (r'[\w.+-]+@[\w-]+\.[\w.-]+', '<EMAIL>'),
+    # NOM Prénom (nom en capitales suivi d'un ou plusieurs prénoms)
+    (r"\b[A-ZÀ-Þ]{2,}(?:[ '-][A-ZÀ-Þ]{2,})*(?: [A-ZÀ-Þ][a-zß-ÿ]+(?:-[A-ZÀ-Þ][a-zß-ÿ]+)?)+\b", '<NOM>'),
+    (r'\b\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?\b', '<DATE>'),
+    (r'\b\d{1,2}[:h]\d{2}(?::\d{2})?\b', '<HEURE>'),
+    (r'\b(?:[^\W\d_]+[-_/]?\d[\w-]*|\d+[^\W\d_][\w-]*)\b', '<ID>'),
+    (r'\d+(?:[.,]\d+)?', '<N>'),
+]
+SIMILARITY = 0.7
+NUM_PERM = 64
+BANDS = 16
+_PRIME = np.uint64(2**31 - 1)
+
+def message_templates(messages):
+    """Gabarits de messages (Series) : valeurs variables masquées, espaces normalisés"""
+    s = pd.Series(messages, dtype=object).fillna('').astype(str)
+    for pattern, token in MASKS:
+        s = s.str.replace(pattern, token, regex=True)
+    return s.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def _shingles(text):
+    """Trigrammes de caractères codés en entiers (texte plus court : le texte entier)"""
+    c = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(c) < 3: c = np.concatenate([c, np.zeros(3 - len(c), dtype=np.uint64)])
+    return np.unique((c[:-2] << np.uint64(42)) | (c[1:-1] << np.uint64(21)) | c[2:]) % _PRIME
+
+def minhash(texts, num_perm=NUM_PERM, seed=0):
+    """Signatures MinHash (len(texts) × num_perm) des ensembles de trigrammes"""
+    sh = [_shingles(t) for t in texts]
+    if not sh: return np.empty((0, num_perm), dtype=np.uint64)
+    flat = np.concatenate(sh)
+    starts = np.concatenate([[0], np.cumsum([len(x) for x in sh])[:-1]])
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**31 - 1, num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**31 - 1, num_perm, dtype=np.uint64)
+    sig = np.empty((len(sh), num_perm), dtype=np.uint64)
+    for k in range(num_perm):
+        sig[:, k] = np.minimum.reduceat((a[k] * flat + b[k]) % _PRIME, starts)
+    return sig
+
+def near_duplicates(texts, threshold=SIMILARITY, num_perm=NUM_PERM, bands=BANDS):
+    """Composantes de textes proches (similarité de Jaccard estimée >= threshold) : étiquette par texte.
+    Candidats par bandes LSH (textes partageant une bande de signature), vérifiés sur la signature complète"""
+    sig = minhash(texts, num_perm)
+    n = len(sig)
+    labels = np.arange(n)
+    if n < 2: return labels
+    r = num_perm // bands
+    pairs = []
+    for i in range(bands):
+        band = np.ascontiguousarray(sig[:, i*r:(i+1)*r]).view(np.dtype((np.void, 8*r))).ravel()
+        _, inv = np.unique(band, return_inverse=True)
+        first = np.full(inv.max() + 1, -1)
+        first[inv[::-1]] = np.arange(n)[::-1]
+        cand = np.flatnonzero(first[inv] != np.arange(n))
+        pairs.append(np.stack([first[inv[cand]], cand]))
+    i, j = np.unique(np.concatenate(pairs, axis=1), axis=1)
+    keep = (sig[i] == sig[j]).mean(axis=1) >= threshold
+    i, j = i[keep], j[keep]
+    while True:
+        m = np.minimum(labels[i], labels[j])
+        new = labels.copy()
+        np.minimum.at(new, i, m)
+        np.minimum.at(new, j, m)
+        new = new[new]
+        if (new == labels).all(): return labels
+        labels = new
+
+class MessageClusters:
+    """Causes d'erreur issues de comptages de messages.
+    counts : Series de comptages indexée par message, ou par (groupe, message) (ex. agence × message)"""
+    COLUMNS = ['Cause', 'Occurrences', '%', 'Gabarits', 'Messages distincts', 'Exemple']
+
+    def __init__(self, counts, threshold=SIMILARITY):
+        counts = counts[counts > 0]
+        idx = counts.index
+        grouped = isinstance(idx, pd.MultiIndex)
+        self.groups = pd.Index(idx.get_level_values(0)) if grouped else None
+        self.weights = counts.to_numpy()
+        m_codes, messages = pd.factorize(pd.Index(idx.get_level_values(-1) if grouped else idx).astype(str))
+        templates = message_templates(messages)
+        t_codes, _ = pd.factorize(pd.util.hash_array(templates.str.lower().to_numpy(object)))
+        t_text = templates.groupby(t_codes).first().to_numpy(object) if len(t_codes) else np.array([], dtype=object)
+        _, t_cluster = np.unique(near_duplicates([t.lower() for t in t_text], threshold), return_inverse=True)
+        tpl = t_codes[m_codes]
+        cl = t_cluster[tpl] if len(tpl) else tpl
+        # Causes numérotées par occurrences décroissantes
+        occ = np.bincount(cl, weights=self.weights, minlength=len(np.unique(t_cluster))) if len(cl) else np.array([])
+        order = np.argsort(-occ, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self.codes = rank[cl] if len(cl) else cl
+        rows = pd.DataFrame({'cluster': self.codes, 'template': tpl, 'message': m_codes, 'n': self.weights})
+        def top_of(col, text):
+            # Le plus fréquent de chaque cause ; à égalité le premier dans l'ordre alphabétique
+            s = rows.groupby(['cluster', col])['n'].sum().reset_index()
+            s['rang'] = np.argsort(np.argsort(np.asarray(text, dtype=str), kind='stable'))[s[col].to_numpy()]
+            s = s.sort_values(['n', 'rang'], ascending=[False, True], kind='stable')
+            return s.drop_duplicates('cluster').sort_values('cluster')[col].to_numpy()
+        total = self.weights.sum()
+        self.summary = pd.DataFrame({
+            'Cause': t_text[top_of('template', t_text)],
+            'Occurrences': occ[order].astype(np.int64),
+            '%': np.round(occ[order]/total*100, 1) if total else occ[order],
+            'Gabarits': rows.groupby('cluster')['template'].nunique().to_numpy(),
+            'Messages distincts': rows.groupby('cluster')['message'].nunique().to_numpy(),
+            'Exemple': np.asarray(messages, dtype=object)[top_of('message', messages)],
+        }, columns=self.COLUMNS)
+
+    @classmethod
+    def from_frame(cls, df, group='Code_Unite', threshold=SIMILARITY):
+        """Causes des lignes KO de df (par groupe si la colonne group existe)"""
+        keys = [c for c in (group, 'Message_Integration') if c in df.columns]
+        ko = df.loc[~ok_mask(df).to_numpy(), keys]
+        ko = ko[ko['Message_Integration'].notna() & (ko['Message_Integration'].astype(str) != '')]
+        return cls(ko.groupby(keys, observed=True, sort=False).size(), threshold)
+
+    def top(self, n=15):
+        return self.summary.head(n)
+
+    def by_group(self, top=None, label='Agence'):
+        """Causes par groupe : label / Cause / Nombre / % des KO du groupe (top causes par groupe si top)"""
+        if self.groups is None: raise ValueError("Comptages sans groupe")
+        g = pd.DataFrame({label: np.asarray(self.groups), 'c': self.codes, 'Nombre': self.weights})
+        g = g.groupby([label, 'c'], sort=False)['Nombre'].sum().reset_index()
+        g['%'] = np.round(g['Nombre'] / g.groupby(label)['Nombre'].transform('sum') * 100, 1)
+        g = g.sort_values([label, 'Nombre', 'c'], ascending=[True, False, True], kind='stable')
+        if top: g = g.groupby(label, sort=False).head(top)
+        g.insert(1, 'Cause', self.summary['Cause'].to_numpy()[g['c'].to_numpy()])
+        return g.drop(columns='c').reset_index(drop=True)
@@ -0,0 +1,53 @@
+"""Cube de comptages agence × mois × statut, stocké dans un tableau numpy"""
+import numpy as np
+import pandas as pd
+
+from .data import date_col
+
+class CountCube:
+    """Comptages indexés par (agence, mois 'AAAA-MM', statut) ; les lignes sans date valide sont ignorées"""
+    def __init__(self, agences=(), mois=(), statuts=(), counts=None):
+        self.agences = pd.Index(agences)
+        self.mois = pd.Index(mois)
+        self.statuts = pd.Index(statuts)
+        self.counts = counts if counts is not None else np.zeros((len(agences), len(mois), len(statuts)), dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, df, agence='Code_Unite', statut='Statut_Final'):
+        dates = date_col(df)
+        valid = dates.notna().to_numpy()
+        axes = [df[agence].to_numpy()[valid], dates[valid].dt.to_period('M').astype(str).to_numpy(),
+                df[statut].astype(str).to_numpy()[valid]]
+        codes, labels = zip(*(pd.factorize(a, sort=True) for a in axes))
+        shape = tuple(len(l) for l in labels)
+        flat = np.ravel_multi_index(codes, shape) if len(codes[0]) else np.array([], dtype=np.int64)
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(*labels, counts)
+
+    def add(self, other):
+        """Cube somme (union des agences, mois et statuts)"""
+        axes = [a.union(b) for a, b in zip((self.agences, self.mois, self.statuts), (other.agences, other.mois, other.statuts))]
+        counts = np.zeros(tuple(len(a) for a in axes), dtype=np.int64)
+        for c in (self, other):
+            ix = np.ix_(*(ax.get_indexer(lab) for ax, lab in zip(axes, (c.agences, c.mois, c.statuts))))
+            counts[ix] += c.counts
+        return CountCube(*axes, counts)
+
+    @property
+    def ok_mask(self):
+        return np.asarray(self.statuts.astype(str).str.upper() == 'OK')
+
+    def monthly(self, agence, decimals=1):
+        """Mois / Total / OK / Taux d'une agence (mois où elle a des contrats), en O(mois × statuts)"""
+        i = self.agences.get_indexer([agence])[0]
+        if i < 0: return pd.DataFrame(columns=['Mois', 'Total', 'OK', 'Taux'])
+        c = self.counts[i]
+        total, ok = c.sum(axis=1), c[:, self.ok_mask].sum(axis=1)
+        keep = total > 0
+        return pd.DataFrame({'Mois': np.asarray(self.mois[keep]), 'Total': total[keep], 'OK': ok[keep],
+                             'Taux': np.round(ok[keep] / total[keep] * 100, decimals)})
+
+    def trend(self, agence):
+        """Variation du taux entre les deux derniers mois de l'agence (None s'il y en a moins de deux)"""
+        m = self.monthly(agence)
+        return float(m['Taux'].iloc[-1] - m['Taux'].iloc[-2]) if len(m) >= 2 else None
@@ -0,0 +1,62 @@
+"""Nettoyage et typage des données Pixid"""
+import hashlib
+import pandas as pd
+
+CATEGORY_MAX_RATIO = 0.5
+DERIVED_COLS = ['is_ok', 'date_dt']
+
+def clean_data(df):
+    """Nettoie et type les données : texte nettoyé, catégories pour les colonnes peu variées,
+    plus les colonnes dérivées is_ok (Statut_Final == OK) et date_dt (Date_Integration parsée)"""
+    df = df.dropna(how='all').dropna(axis=1, how='all')
+    for col in text_cols(df):
+        df[col] = df[col].astype(str).str.strip()
+    df = df.replace('nan', '').fillna('')
+    for col in text_cols(df):
+        if df[col].nunique() <= CATEGORY_MAX_RATIO * len(df):
+            df[col] = df[col].astype('category')
+    return derive(df)
+
+def text_cols(df):
+    """Colonnes texte : object ou str (pandas 2 et 3 ; select_dtypes('str') n'existe qu'à partir de pandas 3)"""
+    return [c for c, dt in df.dtypes.items() if pd.api.types.is_string_dtype(dt)]
+
+def derive(df):
+    """Ajoute les colonnes dérivées is_ok et date_dt (en place)"""
+    if 'Statut_Final' in df.columns:
+        df['is_ok'] = df['Statut_Final'].astype(str).str.upper().eq('OK')
+    if 'Date_Integration' in df.columns:
+        df['date_dt'] = parse_dates(df['Date_Integration'])
+    return df
+
+def visible(df):
+    """Colonnes d'origine uniquement (sans les colonnes dérivées) pour l'affichage et l'export"""
+    return df.drop(columns=[c for c in DERIVED_COLS if c in df.columns])
+
+def ok_mask(df):
+    return df['is_ok'] if 'is_ok' in df.columns else df['Statut_Final'].astype(str).str.upper().eq('OK')
+
+def date_col(df):
+    return df['date_dt'] if 'date_dt' in df.columns else parse_dates(df['Date_Integration'])
+
+def counts(s):
+    """value_counts sans les catégories absentes du sous-ensemble"""
+    vc = s.value_counts()
+    return vc[vc > 0]
+
+def memory_report(before, after):
+    """Empreinte mémoire par colonne avant/après nettoyage (Mo)"""
+    mb = lambda df: df.memory_usage(deep=True, index=False) / 2**20
+    rep = pd.DataFrame({'Avant (Mo)': mb(before), 'Après (Mo)': mb(after), 'Type': after.dtypes.astype(str)}).reindex(after.columns)
+    rep.loc['TOTAL'] = [rep['Avant (Mo)'].sum(), rep['Après (Mo)'].sum(), '']
+    return rep.rename_axis('Colonne').reset_index().round(2)
+
+def parse_dates(s):
+    """Parse une colonne de dates valeur par valeur (comme pd.to_datetime sur un scalaire), une fois par valeur distincte"""
+    if pd.api.types.is_datetime64_any_dtype(s): return s
+    codes, uniq = pd.factorize(s)
+    parsed = pd.to_datetime(pd.Series(uniq, dtype=object), format='mixed', errors='coerce')
+    return pd.Series(parsed.to_numpy()[codes], index=s.index).where(codes >= 0)
+
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,466 @@
+"""Rapport Excel 7 onglets : contenu des onglets et moteurs d'écriture (classique / flux)"""
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import Rule
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.differential import DifferentialStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+
+from .data import visible, ok_mask, date_col, counts
+from .metrics import agency_metrics, temporal_metrics
+from .clustering import MessageClusters
+from .parallel import PARALLEL_WORKERS
+from .settings import env_number
+
+# L'écriture en flux sert surtout la mémoire : à 30 000 lignes, ~3 Mo alloués contre ~66 Mo en mode classique,
+# pour un temps à peine plus court (3,5 s contre 4,6 s) depuis que les styles nommés accélèrent le mode classique
+STREAMING_MIN_ROWS = 20000
+CHUNK_ROWS = 5000
+# Nombre maximal de lignes examinées pour estimer les largeurs de colonnes
+WIDTH_SAMPLE = 20000
+# Threads de construction des onglets : peu suffisent (7 onglets, GIL) ; le CLI multiprocessus passe 1
+SHEET_WORKERS = env_number('ANALYZER_SHEET_WORKERS', min(4, PARALLEL_WORKERS), int)
+THIN = Side(style='thin')
+BORDER = Border(left=THIN,right=THIN,top=THIN,bottom=THIN)
+# Lignes paires grisées / impaires blanches, toutes bordées
+BAND_DXF = (DifferentialStyle(fill=PatternFill(bgColor="F2F2F2",fill_type="solid"), border=BORDER),
+            DifferentialStyle(border=BORDER))
+
+# Styles nommés partagés : police, couleur de fond
+XL_STYLES = {
+    'header': (Font(bold=True,color="FFFFFF",size=11), "366092"),
+    'title': (Font(bold=True,size=14,color="366092"), None),
+    'title_red': (Font(bold=True,size=13,color="FF0000"), None),
+    'section': (Font(bold=True,size=12), None),
+    'section_red': (Font(bold=True,size=12,color="C00000"), None),
+    'section_green': (Font(bold=True,size=12,color="00B050"), None),
+    'hdr_blue': (Font(bold=True,color="FFFFFF"), "4472C4"),
+    'hdr_green': (Font(bold=True,color="FFFFFF"), "70AD47"),
+    'hdr_red': (Font(bold=True,color="FFFFFF"), "C00000"),
+    'hdr_top': (Font(bold=True,color="FFFFFF"), "00B050"),
+    'good': (None, "C6EFCE"),
+    'bad': (None, "FFC7CE"),
+    'medium': (None, "FFEB9C"),
+    'link': (Font(color="0563C1",underline='single'), None),
+}
+
+class SheetSpec:
+    """Contenu d'un onglet indépendant du moteur d'écriture.
+    rows : lignes de valeurs ; styles : {index de ligne: nom de style ou liste par cellule} ;
+    banded : en-tête + lignes alternées (style_ws) ; widths : largeurs connues à l'avance ;
+    nrows : nombre de lignes lorsque rows est un générateur (progression)"""
+    def __init__(self, title, rows, banded=True, styles=None, merges=(), widths=None, ncols=None, nrows=None):
+        self.title = title
+        self.rows = rows
+        self.banded = banded
+        self.styles = styles or {}
+        self.merges = merges
+        self.widths = widths
+        self.ncols = ncols
+        self.nrows = nrows
+
+def df_rows(df, header=True, chunk=CHUNK_ROWS):
+    """Lignes d'un DataFrame par paquets (NaN -> None), sans matérialiser tout le tableau"""
+    if header: yield list(df.columns)
+    for i in range(0, len(df), chunk):
+        part = df.iloc[i:i+chunk].astype(object)
+        yield from part.where(part.notna(), None).to_numpy().tolist()
+
+def df_widths(df, sample=WIDTH_SAMPLE):
+    """Largeurs de colonnes estimées sur un échantillon (longueur max + 2, plafonnée à 50)"""
+    s = df if len(df) <= sample else df.sample(sample, random_state=0)
+    return [min(max(len(str(c)), int(s[c].astype(str).str.len().max() or 0) if len(s) else 0)+2, 50) for c in df.columns]
+
+def rows_widths(rows, sample=WIDTH_SAMPLE):
+    """Largeurs de colonnes d'une liste de lignes, estimées sur au plus sample lignes réparties (dont la première)"""
+    if len(rows) > sample: rows = rows[::-(-len(rows)//sample)]
+    w = {}
+    for row in rows:
+        for i,v in enumerate(row):
+            w[i] = max(w.get(i,0), len(str(v if v is not None else '')))
+    return [min(w[i]+2, 50) for i in sorted(w)]
+
+def _table(rows, styles, df, head_style=None, body_style=None, cell_style=None):
+    """Ajoute un DataFrame (en-tête + lignes) à un onglet construit ligne par ligne"""
+    if head_style: styles[len(rows)] = head_style
+    rows.append(list(df.columns))
+    for vals in df.itertuples(index=False, name=None):
+        if body_style: styles[len(rows)] = body_style
+        elif cell_style: styles[len(rows)] = [cell_style(i,v) for i,v in enumerate(vals)]
+        rows.append(list(vals))
+
+def _sheet_donnees(df):
+    df = visible(df)
+    return SheetSpec('Données nettoyées', df_rows(df), widths=df_widths(df), ncols=len(df.columns), nrows=len(df)+1)
+
+def _sheet_lien(df, target):
+    """Onglet 1 allégé : lien vers le fichier de données exporté à côté du rapport (chemin relatif)"""
+    df = visible(df)
+    t = target.replace('"', '""')  # guillemets doublés dans une chaîne de formule Excel
+    rows = [['Données nettoyées','Valeur'],
+            ['Fichier de données',f'=HYPERLINK("{t}","{t}")'],
+            ['Nombre de lignes',len(df)],
+            ['Nombre de colonnes',len(df.columns)],
+            ['Colonnes',', '.join(map(str, df.columns))]]
+    return SheetSpec('Données nettoyées', rows, styles={1: [None,'link']}, widths=[22, min(max(len(target), 30)+2, 80)])
+
+def _sheet_vue(df):
+    total = len(df)
+    ok = len(df[ok_mask(df)])
+    ko = total - ok
+    taux = round(ok/total*100,2) if total else 0
+    init = len(df[df['Initial/Avenant'].str.contains('Initial',case=False,na=False)])
+    aven = len(df[df['Initial/Avenant'].str.contains('Avenant',case=False,na=False)])
+    vue = [['Métrique','Valeur'],
+           ['Nombre total de contrats',total],
+           ['Nombre de contrats OK',ok],
+           ['Nombre de contrats KO',ko],
+           ['Taux de réussite (%)',f'{taux}%'],
+           ['Nombre de contrats initiaux',init],
+           ['Nombre d\'avenants',aven],
+           ['Nombre d\'agences',df['Code_Unite'].nunique() if 'Code_Unite' in df.columns else 0]]
+    return SheetSpec('Vue d ensemble', vue)
+
+def _sheet_agences(df, df_ag=None):
+    if 'Code_Unite' not in df.columns or 'Statut_Final' not in df.columns: return None
+    total = len(df)
+    rows, styles = [], {}
+    def title(text, style):
+        styles[len(rows)] = [style]
+        rows.append([text])
+
+    title('ANALYSE COMPLÈTE PAR AGENCE (CODE_UNITE)', 'title')
+    rows.append([])
+
+    # Calculer métriques
+    if df_ag is None:
+        df_ag = agency_metrics(df)
+    moy = df_ag['Taux'].mean()
+
+    # Dashboard exécutif
+    title('🎯 DASHBOARD EXÉCUTIF', 'title_red')
+    styles[len(rows)] = 'hdr_blue'
+    rows += [['Indicateur','Valeur'],
+             ['🏆 Meilleure agence',f"{df_ag.loc[df_ag['Taux'].idxmax(),'Agence']} ({df_ag['Taux'].max():.1f}%)"],
+             ['🔴 Pire agence',f"{df_ag.loc[df_ag['Taux'].idxmin(),'Agence']} ({df_ag['Taux'].min():.1f}%)"],
+             ['📊 Taux moyen national',f'{moy:.1f}%'],
+             ['⚠️ Agences en alerte (< 60%)',len(df_ag[df_ag['Taux']<60])],
+             ['✅ Agences au-dessus moyenne',f"{len(df_ag[df_ag['Taux']>=moy])}/{len(df_ag)}"],
+             ['📈 Total agences',len(df_ag)],[],[]]
+
+    # Classement général
+    title('1. 🏆 CLASSEMENT GÉNÉRAL DES AGENCES', 'section')
+    df_class = df_ag.sort_values('Rang', kind='stable')[['Rang','Agence','Total','OK','KO','Taux','Écart vs Moyenne','Statut']]
+    band = {'🟢':'good','🔴':'bad','🟡':'medium'}
+    _table(rows, styles, df_class, 'hdr_green', cell_style=lambda i,v: band.get(str(v)[:1]) if i==7 else None)
+    rows += [[],[]]
+
+    # Agences à risque
+    risque = df_class[df_class['Taux']<60]
+    if len(risque)>0:
+        title('2. ⚠️ AGENCES À RISQUE (Taux < 60%)', 'section_red')
+        risque_display = risque.copy()
+        risque_display['Action recommandée'] = 'Audit urgent + Plan d\'action'
+        _table(rows, styles, risque_display, 'hdr_red', 'bad')
+        rows += [[],[]]
+
+    # Top 5 performers
+    title('3. 🌟 TOP 5 PERFORMERS', 'section_green')
+    _table(rows, styles, df_class.head(5), 'hdr_top', 'good')
+    rows += [[],[]]
+
+    # Volume par agence
+    title('4. 📊 VOLUME TOTAL PAR AGENCE', 'section')
+    vol = counts(df['Code_Unite']).reset_index()
+    vol.columns = ['Agence','Nombre total']
+    vol['% du total'] = round(vol['Nombre total']/total*100,2)
+    _table(rows, styles, vol)
+    rows += [[],[]]
+
+    # Croisement Agences × Types d'erreurs
+    df_ko = df[~ok_mask(df)]
+    if len(df_ko)>0:
+        title('5. 🔀 CROISEMENT AGENCES × TYPES D\'ERREURS', 'section')
+        try:
+            _table(rows, styles, pd.crosstab(df_ko['Code_Unite'],df_ko['Statut_Final'],margins=True).reset_index())
+        except: pass
+    return SheetSpec('Analyse par agence', rows, banded=False, styles=styles, merges=['A1:G1'])
+
+def _sheet_ok(df):
+    df_ok = df[ok_mask(df)]
+    ok, total = len(df_ok), len(df)
+    if ok == 0: return None
+    rows = [['ANALYSE DES CONTRATS OK'], [],
+            ['Métrique','Valeur'],
+            ['Total contrats OK',ok],
+            ['% du total',f'{round(ok/total*100,1)}%'],
+            ['Nombre de types différents',df_ok['Type (libellé)'].nunique()],
+            ['Nombre d\'agences',df_ok['Code_Unite'].nunique()],
+            []]
+
+    # Par type
+    rows.append(['RÉPARTITION PAR TYPE DE CONTRAT'])
+    ok_type = counts(df_ok['Type (libellé)']).reset_index()
+    ok_type.columns = ['Type','Nombre']
+    ok_type['%'] = round(ok_type['Nombre']/ok*100,1)
+    rows += df_rows(ok_type)
+    rows.append([])
+
+    # Par agence
+    rows.append(['RÉPARTITION PAR AGENCE'])
+    ok_ag = counts(df_ok['Code_Unite']).reset_index()
+    ok_ag.columns = ['Agence','Nombre']
+    ok_ag['%'] = round(ok_ag['Nombre']/ok*100,1)
+    rows += df_rows(ok_ag)
+    return SheetSpec('Contrats OK', rows)
+
+def _sheet_ko(df):
+    df_ko = df[~ok_mask(df)]
+    ko, total = len(df_ko), len(df)
+    if ko == 0: return None
+    rows = [['ANALYSE DES CONTRATS KO'], [],
+            ['Métrique','Valeur'],
+            ['Total contrats KO',ko],
+            ['% du total',f'{round(ko/total*100,1)}%'],
+            ['Taux d\'échec',f'{round(ko/total*100,1)}%'],
+            ['Nombre de types d\'erreurs',df_ko['Statut_Final'].nunique()],
+            ['Nombre d\'agences concernées',df_ko['Code_Unite'].nunique()],
+            []]
+
+    # Types d'erreurs
+    rows.append(['RÉPARTITION DES ERREURS PAR STATUT'])
+    ko_stat = counts(df_ko['Statut_Final']).reset_index()
+    ko_stat.columns = ['Type d\'erreur','Nombre']
+    ko_stat['%'] = round(ko_stat['Nombre']/ko*100,1)
+    rows += df_rows(ko_stat)
+    rows.append([])
+
+    # Par agence
+    rows.append(['REJETS PAR AGENCE'])
+    ko_ag = counts(df_ko['Code_Unite']).reset_index()
+    ko_ag.columns = ['Agence','Nombre de rejets']
+    ko_ag['% des rejets'] = round(ko_ag['Nombre de rejets']/ko*100,1)
+    rows += df_rows(ko_ag)
+    rows.append([])
+
+    # Messages d'erreur
+    if 'Message_Integration' in df_ko.columns:
+        msg_int = counts(df_ko.loc[df_ko['Message_Integration']!='','Message_Integration']).head(15)
+        if len(msg_int)>0:
+            rows.append(['TOP 15 MESSAGES D\'ERREUR - INTÉGRATION'])
+            rows += df_rows(pd.DataFrame({'Message':msg_int.index,'Occurrences':msg_int.values}))
+            rows.append([])
+
+        # Causes : messages ramenés à leur gabarit et regroupés
+        causes = MessageClusters.from_frame(df)
+        if len(causes.summary)>0:
+            rows.append(['CAUSES D\'ERREUR (MESSAGES REGROUPÉS)'])
+            rows += df_rows(causes.top(15))
+            rows.append([])
+            if causes.groups is not None:
+                rows.append(['PRINCIPALES CAUSES PAR AGENCE'])
+                rows += df_rows(causes.by_group(top=3))
+                rows.append([])
+
+    # Par type de contrat
+    rows.append(['CONTRATS KO PAR TYPE'])
+    ko_type = counts(df_ko['Type (libellé)']).reset_index()
+    ko_type.columns = ['Type','Nombre KO']
+    rows += df_rows(ko_type)
+    return SheetSpec('Contrats KO', rows)
+
+def _sheet_types(df):
+    total = len(df)
+    rows = [['ANALYSE DES TYPES DE CONTRATS ET AVENANTS'], []]
+
+    # Initial vs Avenant
+    rows.append(['RÉPARTITION INITIAL VS AVENANT'])
+    ia = counts(df['Initial/Avenant']).reset_index()
+    ia.columns = ['Catégorie','Nombre']
+    ia['%'] = round(ia['Nombre']/total*100,1)
+    rows += df_rows(ia)
+    rows.append([])
+
+    # Types détaillés
+    rows.append(['DÉTAIL PAR TYPE DE CONTRAT'])
+    types = counts(df['Type (libellé)']).reset_index()
+    types.columns = ['Type','Nombre']
+    types['%'] = round(types['Nombre']/total*100,1)
+    rows += df_rows(types)
+    rows.append([])
+
+    # Croisement Type × Statut
+    rows.append(['CROISEMENT TYPE × STATUT'])
+    try:
+        rows += df_rows(pd.crosstab(df['Type (libellé)'],df['Statut_Final'],margins=True).reset_index())
+    except: pass
+    return SheetSpec('Types et Avenants', rows)
+
+def _sheet_temporelle(df):
+    if 'Date_Integration' not in df.columns: return None
+    dates = date_col(df).dropna()
+    rows = []
+    if len(dates)>0:
+        daily, monthly = temporal_metrics(df)
+        rows += [['ANALYSE TEMPORELLE'], [],
+                 ['Métrique','Valeur'],
+                 ['Date la plus ancienne',dates.min().strftime('%d/%m/%Y')],
+                 ['Date la plus récente',dates.max().strftime('%d/%m/%Y')],
+                 ['Nombre de jours couverts',(dates.max()-dates.min()).days],
+                 []]
+
+        # Par jour
+        rows.append(['VOLUME PAR JOUR'])
+        rows += df_rows(daily)
+        rows.append([])
+
+        # Par mois
+        rows.append(['VOLUME PAR MOIS'])
+        rows += df_rows(monthly)
+    return SheetSpec('Analyse temporelle', rows, banded=bool(rows))
+
+EXCEL_SHEETS = {
+    'Données nettoyées': lambda df, df_ag: _sheet_donnees(df),
+    'Vue d ensemble': lambda df, df_ag: _sheet_vue(df),
+    'Analyse par agence': _sheet_agences,
+    'Contrats OK': lambda df, df_ag: _sheet_ok(df),
+    'Contrats KO': lambda df, df_ag: _sheet_ko(df),
+    'Types et Avenants': lambda df, df_ag: _sheet_types(df),
+    'Analyse temporelle': lambda df, df_ag: _sheet_temporelle(df),
+}
+
+def excel_sheets(df, df_ag=None, sheets=None, data_link=None, workers=None):
+    """Les onglets du rapport, dans l'ordre (sheets : noms à inclure, tous par défaut ; onglets sans objet omis).
+    Les contenus sont calculés dans des threads (workers, SHEET_WORKERS par défaut) ; l'écriture reste séquentielle.
+    data_link : fichier de données joint, l'onglet 1 devient un lien vers ce fichier au lieu d'une copie des lignes"""
+    builders = {name: build for name, build in EXCEL_SHEETS.items() if sheets is None or name in sheets}
+    if data_link and 'Données nettoyées' in builders:
+        builders['Données nettoyées'] = lambda df, df_ag: _sheet_lien(df, data_link)
+    workers = min(workers or SHEET_WORKERS, len(builders))
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as ex:
+            specs = list(ex.map(lambda build: build(df, df_ag), builders.values()))
+    else:
+        specs = [build(df, df_ag) for build in builders.values()]
+    return [s for s in specs if s is not None]
+
+def _named_styles(wb):
+    """Enregistre les styles XL_STYLES dans le classeur (une seule fois) : les cellules n'en portent que le nom"""
+    known = set(wb.named_styles)
+    for name,(font,color) in XL_STYLES.items():
+        if name in known: continue
+        ns = NamedStyle(name=name, font=font or DEFAULT_FONT)
+        if color: ns.fill = PatternFill(start_color=color,end_color=color,fill_type="solid")
+        if name == 'header':
+            ns.alignment = Alignment(horizontal='center',vertical='center')
+            ns.border = BORDER
+        wb.add_named_style(ns)
+
+def band_rows(ws, nrows, ncols):
+    """Lignes alternées et bordures du corps (A2 à la dernière ligne) par deux règles de mise en forme conditionnelle"""
+    if nrows < 2: return
+    body = f"A2:{get_column_letter(ncols or 1)}{nrows}"
+    for parity,dxf in zip((0,1), BAND_DXF):
+        ws.conditional_formatting.add(body, Rule(type='expression', formula=[f'MOD(ROW(),2)={parity}'], dxf=dxf))
+
+def style_ws(ws, widths=None):
+    """En-tête, lignes alternées, largeurs et volet figé d'un onglet tabulaire.
+    Coût indépendant du nombre de lignes (hors estimation des largeurs, échantillonnée) : aucun style par cellule du corps"""
+    _named_styles(ws.parent)
+    for c in ws[1]: c.style = 'header'
+    band_rows(ws, ws.max_row, ws.max_column)
+    if widths is None:
+        step = -(-ws.max_row // WIDTH_SAMPLE)
+        widths = rows_widths([r for i,r in enumerate(ws.iter_rows(values_only=True)) if i % step == 0])
+    for j,w in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(j)].width = w
+    ws.freeze_panes = 'A2'
+
+def _write_classic(specs):
+    wb = Workbook()
+    wb.remove(wb.active)
+    _named_styles(wb)
+    for spec in specs:
+        ws = wb.create_sheet(spec.title)
+        rows = spec.rows if spec.widths or not spec.banded else list(spec.rows)
+        for i,row in enumerate(rows):
+            ws.append(row)
+            st_row = spec.styles.get(i)
+            if st_row is None: continue
+            for j,name in enumerate([st_row]*len(row) if isinstance(st_row,str) else st_row, 1):
+                if name: ws.cell(i+1, j).style = name
+        for rng in spec.merges: ws.merge_cells(rng)
+        if spec.banded: style_ws(ws, spec.widths or rows_widths(rows))
+    return wb
+
+def _write_streaming(specs):
+    wb = Workbook(write_only=True)
+    _named_styles(wb)
+    try:
+        _stream_sheets(wb, specs)
+    except BaseException:
+        # Écriture interrompue (annulation...) : fermer les fichiers temporaires des onglets
+        for ws in wb.worksheets: ws.close()
+        raise
+    return wb
+
+def _stream_sheets(wb, specs):
+    for spec in specs:
+        ws = wb.create_sheet(spec.title)
+        rows = spec.rows if spec.widths else list(spec.rows)
+        widths = spec.widths or rows_widths(rows)
+        for j,w in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(j)].width = w
+        if spec.banded: ws.freeze_panes = 'A2'
+        n = 0
+        for i,row in enumerate(rows):
+            st_row = 'header' if spec.banded and i == 0 else spec.styles.get(i)
+            if spec.banded and i == 0: row = list(row) + [None]*(len(widths)-len(row))
+            if st_row is not None:
+                row = [_styled(ws, v, st_row if isinstance(st_row,str) else (st_row[j] if j < len(st_row) else None)) for j,v in enumerate(row)]
+            ws.append(row)
+            n += 1
+        for rng in spec.merges: ws.merged_cells.add(rng)
+        if spec.banded: band_rows(ws, n, spec.ncols or len(widths))
+
+def _styled(ws, v, name):
+    if not name: return v
+    c = WriteOnlyCell(ws, value=v)
+    c.style = name
+    return c
+
+def _tracked(specs, progress, chunk=CHUNK_ROWS):
+    """Remplace les lignes des onglets par des générateurs qui appellent progress(lignes écrites, lignes totales)"""
+    total = sum(s.nrows or len(s.rows) for s in specs)
+    done = 0
+    def rows(it):
+        nonlocal done
+        for row in it:
+            yield row
+            done += 1
+            if done % chunk == 0: progress(done, total)
+    progress(0, total)
+    for s in specs:
+        if s.nrows is None: s.nrows = len(s.rows)
+        s.rows = rows(s.rows)
+
+def create_excel(df, df_ag=None, streaming=None, sheets=None, data_link=None, workers=None, progress=None):
+    """Crée Excel ULTRA-DÉTAILLÉ avec 7 onglets complets (df_ag : métriques agences déjà calculées).
+    streaming : écriture en flux (mémoire constante) ; par défaut au-delà de STREAMING_MIN_ROWS lignes
+    sheets : sous-ensemble d'onglets à générer (voir EXCEL_SHEETS)
+    data_link, workers : voir excel_sheets
+    progress : fonction (lignes écrites, lignes totales) appelée tous les CHUNK_ROWS lignes"""
+    if streaming is None:
+        streaming = len(df) >= STREAMING_MIN_ROWS and not (data_link and (sheets is None or 'Données nettoyées' in sheets))
+    specs = excel_sheets(df, df_ag, sheets, data_link, workers)
+    if progress: _tracked(specs, progress)
+    wb = _write_streaming(specs) if streaming else _write_classic(specs)
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,126 @@
+"""Exports par paquets : CSV (éventuellement gzip), Parquet et XLSX produits à partir d'un générateur de
+DataFrames, sans jamais matérialiser le résultat complet en mémoire"""
+import io
+import tempfile
+import zipfile
+import zlib
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .data import visible
+from .excel import SheetSpec, df_rows, df_widths, _write_streaming, create_excel
+
+EXPORT_CHUNK_ROWS = 50000
+# Au-delà, le fichier généré passe de la mémoire à un fichier temporaire
+SPOOL_MAX_BYTES = 32 * 2**20
+
+def iter_frames(df, pos=None, extra=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Paquets de lignes d'une vue : positions pos dans df (None = toutes), colonnes visibles,
+    plus les colonnes extra (nom -> tableau aligné sur pos). Vue vide : un seul paquet vide, pour que
+    l'export garde l'en-tête (CSV), le schéma (Parquet) ou la ligne de titres (XLSX)"""
+    n = len(df) if pos is None else len(pos)
+    for i in range(0, max(n, 1), chunk_rows):
+        part = visible(df.iloc[i:i+chunk_rows] if pos is None else df.iloc[pos[i:i+chunk_rows]])
+        if extra: part = part.assign(**{k: v[i:i+chunk_rows] for k, v in extra.items()})
+        yield part
+
+def _at_least_one(frames):
+    """Les paquets, ou un DataFrame vide s'il n'y en a aucun (les formats binaires doivent rester lisibles)"""
+    empty = True
+    for part in frames:
+        empty = False
+        yield part
+    if empty: yield pd.DataFrame()
+
+def csv_chunks(frames, compress=False):
+    """CSV (UTF-8, en-tête sur le premier paquet) ; compress : flux gzip"""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    for i, part in enumerate(frames):
+        data = part.to_csv(index=False, header=i == 0).encode()
+        if z: data = z.compress(data)
+        if data: yield data
+    if z: yield z.flush()
+
+class _Sink(io.RawIOBase):
+    """Fichier en écriture seule dont on récupère le contenu au fur et à mesure"""
+    def __init__(self):
+        self.parts, self.pos = [], 0
+    def writable(self): return True
+    def write(self, b):
+        self.parts.append(bytes(b))
+        self.pos += len(b)
+        return len(b)
+    def tell(self): return self.pos
+    def drain(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+def parquet_chunks(frames):
+    """Parquet : un groupe de lignes par paquet (sans paquet : fichier valide sans colonne)"""
+    sink, writer = _Sink(), None
+    for part in _at_least_one(frames):
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        if writer is None: writer = pq.ParquetWriter(sink, table.schema)
+        else: table = table.cast(writer.schema)
+        writer.write_table(table)
+        data = sink.drain()
+        if data: yield data
+    writer.close()
+    yield sink.drain()
+
+def xlsx_chunks(frames, title='Données'):
+    """XLSX en écriture flux (openpyxl write-only) : largeurs estimées sur le premier paquet"""
+    frames = iter(_at_least_one(frames))
+    first = next(frames)
+    def rows():
+        yield from df_rows(first)
+        for part in frames: yield from df_rows(part, header=False)
+    wb = _write_streaming([SheetSpec(title, rows(), widths=df_widths(first))])
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while data := f.read(2**20): yield data
+
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv', lambda frames: csv_chunks(frames)),
+    'CSV (gzip)': ('csv.gz', 'application/gzip', lambda frames: csv_chunks(frames, compress=True)),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet', parquet_chunks),
+    'Excel (XLSX)': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', xlsx_chunks),
+}
+
+def export_chunks(fmt, frames):
+    return EXPORT_FORMATS[fmt][2](frames)
+
+def spool(chunks, max_bytes=SPOOL_MAX_BYTES):
+    """Assemble les paquets dans un fichier temporaire (en mémoire jusqu'à max_bytes), rembobiné"""
+    f = tempfile.SpooledTemporaryFile(max_size=max_bytes)
+    for data in chunks: f.write(data)
+    f.seek(0)
+    return f
+
+def _counted(frames, report):
+    """Relais des paquets, report(lignes déjà fournies) avant chacun"""
+    n = 0
+    for part in frames:
+        report(n)
+        yield part
+        n += len(part)
+    report(n)
+
+def report_bundle(df, df_ag=None, sheets=None, fmt='Parquet', name='analyse', workers=None, progress=None):
+    """Archive ZIP (fichier temporaire rembobiné) : rapport Excel dont l'onglet 1 est un lien vers le fichier
+    de données joint au format fmt (voir EXPORT_FORMATS), écrit par paquets dans l'archive.
+    progress : fonction (lignes de données écrites, lignes totales)"""
+    ext = EXPORT_FORMATS[fmt][0]
+    data_name = f"{name}_donnees.{ext}"
+    f = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        z.writestr(f"{name}.xlsx", create_excel(df, df_ag, sheets=sheets, data_link=data_name, workers=workers).getvalue())
+        with z.open(data_name, 'w', force_zip64=True) as out:
+            frames = iter_frames(df)
+            if progress: frames = _counted(frames, lambda k: progress(k, len(df)))
+            for data in export_chunks(fmt, frames): out.write(data)
+    f.seek(0)
+    return f
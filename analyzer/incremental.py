@@ -0,0 +1,193 @@
+"""Mode incrémental : fusion d'un delta quotidien dans un jeu de données déjà analysé,
+avec mise à jour additive des agrégats (sans relire les lignes existantes)"""
+import copy
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from .data import visible, ok_mask, date_col, derive, DERIVED_COLS, CATEGORY_MAX_RATIO
+from .metrics import agency_table
+from .cube import CountCube
+from .clustering import MessageClusters, SIMILARITY
+
+KEY_COLS = ('Contrat', 'Date_Integration')
+COUNT_COLS = ('Statut_Final', 'Type (libellé)', 'Initial/Avenant', 'Code_Unite')
+CROSS_COLS = (('Code_Unite', 'Statut_Final'), ('Type (libellé)', 'Statut_Final'))
+TOP_ERRORS = 15
+
+def row_keys(df):
+    """Hash de la clé de dédoublonnage (Contrat + Date_Integration, sinon toutes les colonnes) de chaque ligne"""
+    cols = [c for c in KEY_COLS if c in df.columns] or list(visible(df).columns)
+    return pd.util.hash_pandas_object(df[cols].astype(str), index=False).to_numpy()
+
+def _plain(s):
+    # Index catégoriel -> index ordinaire, pour additionner des comptages issus de fichiers différents
+    if isinstance(s.index, pd.CategoricalIndex): s.index = pd.Index(np.asarray(s.index), name=s.index.name)
+    return s
+
+def _add(a, b):
+    """Somme de deux comptages, dans l'ordre de première apparition"""
+    if a is None: return b.copy()
+    pos = a.index.get_indexer(b.index)
+    new = pos < 0
+    bv = b.to_numpy()
+    values = np.concatenate([a.to_numpy(), bv[new]])
+    values[pos[~new]] += bv[~new]
+    idx = a.index.append(b.index[new])
+    return pd.DataFrame(values, idx, a.columns) if isinstance(a, pd.DataFrame) else pd.Series(values, idx, name=a.name)
+
+def _counts(s):
+    vc = _plain(s.value_counts(sort=False))
+    return vc[vc > 0]
+
+class Aggregates:
+    """Agrégats additifs d'un jeu de données : comptages par agence, OK/KO, volumes par jour et par mois,
+    répartitions par colonne, croisements, cube agence × mois × statut et messages d'erreur (global et par agence).
+    add(delta) ne relit pas les lignes déjà agrégées : son coût dépend du delta et de la taille des comptages
+    (agences, jours, messages...), le nombre de lignes n'intervenant que par la recherche des clés (log N)"""
+    def __init__(self):
+        self.rows = 0
+        self.ok = 0
+        # Clés des lignes agrégées : tableaux triés disjoints, de tailles décroissantes (fusionnés par paires au besoin)
+        self.key_runs = ()
+        self.agences = None
+        self.daily = None
+        self.monthly = None
+        self.values = {}
+        self.ko_values = None
+        self.cross = {}
+        self.errors = None
+        self.agency_errors = None
+        self.cube = None
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls().add(df)
+
+    def _seen(self, h):
+        """Masque des clés h déjà agrégées (recherche dichotomique dans chaque tableau)"""
+        seen = np.zeros(len(h), dtype=bool)
+        for run in self.key_runs:
+            seen |= run[np.minimum(np.searchsorted(run, h), len(run) - 1)] == h
+        return seen
+
+    def _add_keys(self, h):
+        h = np.unique(h)
+        runs = list(self.key_runs)
+        if len(h): runs.append(h[~self._seen(h)])
+        # Fusion tant que l'avant-dernier tableau n'est pas plus de 2 fois plus grand : O(log N) tableaux au plus,
+        # chaque clé n'est refusionnée qu'O(log N) fois
+        while len(runs) > 1 and len(runs[-2]) <= 2 * len(runs[-1]):
+            b, a = runs.pop(), runs.pop()
+            runs.append(np.sort(np.concatenate([a, b]), kind='stable'))
+        self.key_runs = tuple(r for r in runs if len(r))
+
+    def new_rows(self, delta):
+        """Lignes du delta absentes des données déjà agrégées (et dédoublonnées entre elles)"""
+        h = row_keys(delta)
+        return delta[~self._seen(h) & ~pd.Series(h).duplicated().to_numpy()]
+
+    def add(self, df):
+        """Ajoute des lignes (déjà dédoublonnées) aux agrégats ; renvoie self"""
+        self.rows += len(df)
+        self._add_keys(row_keys(df))
+        if 'Statut_Final' in df.columns:
+            ok = ok_mask(df)
+            self.ok += int(ok.sum())
+            self.ko_values = _add(self.ko_values, _counts(df.loc[~ok.to_numpy(), 'Statut_Final']))
+            if 'Code_Unite' in df.columns:
+                g = ok.groupby(df['Code_Unite'], sort=False, dropna=False)
+                self.agences = _add(self.agences, _plain(pd.DataFrame({'Total': g.size(), 'OK': g.sum()})))
+            if 'Message_Integration' in df.columns:
+                msg = df.loc[~ok.to_numpy(), 'Message_Integration']
+                msg = msg[msg.astype(str) != '']
+                self.errors = _add(self.errors, _counts(msg))
+                if 'Code_Unite' in df.columns:
+                    vc = msg.groupby(df.loc[msg.index, 'Code_Unite'], observed=True).value_counts()
+                    vc.index = pd.MultiIndex.from_arrays([np.asarray(vc.index.get_level_values(i)) for i in (0, 1)], names=['Code_Unite', 'Message_Integration'])
+                    self.agency_errors = _add(self.agency_errors, vc[vc > 0])
+        if 'Date_Integration' in df.columns:
+            dates = date_col(df).dropna()
+            self.daily = _add(self.daily, dates.dt.date.value_counts(sort=False))
+            self.monthly = _add(self.monthly, dates.dt.to_period('M').astype(str).value_counts(sort=False))
+        if {'Code_Unite', 'Statut_Final', 'Date_Integration'} <= set(df.columns):
+            cube = CountCube.from_frame(df)
+            self.cube = cube if self.cube is None else self.cube.add(cube)
+        for c in COUNT_COLS:
+            if c in df.columns: self.values[c] = _add(self.values.get(c), _counts(df[c]))
+        for a, b in CROSS_COLS:
+            if a in df.columns and b in df.columns:
+                vc = df.groupby([a, b], observed=True).size()
+                vc.index = pd.MultiIndex.from_arrays([np.asarray(vc.index.get_level_values(i)) for i in (0, 1)], names=[a, b])
+                self.cross[(a, b)] = _add(self.cross.get((a, b)), vc[vc > 0])
+        return self
+
+    def plus(self, df):
+        """Copie des agrégats augmentée de df (les agrégats d'origine restent inchangés).
+        add() remplace les comptages au lieu de les modifier : la copie partage ceux que le delta ne touche pas"""
+        new = copy.copy(self)
+        new.values, new.cross = dict(self.values), dict(self.cross)
+        return new.add(df)
+
+    @property
+    def ko(self):
+        return self.rows - self.ok
+
+    def agency_metrics(self, decimals=2):
+        return agency_table(self.agences['Total'], self.agences['OK'], decimals)
+
+    def temporal(self):
+        """(daily, monthly) comme temporal_metrics"""
+        daily = self.daily.sort_index().rename_axis('Date').reset_index(name='Nombre')
+        monthly = self.monthly.sort_index().rename_axis('Mois').reset_index(name='Nombre')
+        return daily, monthly
+
+    def counts(self, col):
+        """Équivalent de counts(df[col]) : comptages décroissants"""
+        return self.values[col].sort_values(ascending=False, kind='stable')
+
+    def crosstab(self, a, b, ko_only=False):
+        """Équivalent de pd.crosstab(df[a], df[b]) (lignes KO seulement si ko_only)"""
+        s = self.cross[(a, b)]
+        if ko_only: s = s[s.index.get_level_values(b).astype(str).str.upper() != 'OK']
+        return s.unstack(fill_value=0).sort_index().sort_index(axis=1)
+
+    def error_causes(self, threshold=SIMILARITY):
+        """Messages d'erreur regroupés par cause (MessageClusters, par agence si possible), sans relire les lignes"""
+        return MessageClusters(self.agency_errors if self.agency_errors is not None
+                               else self.errors if self.errors is not None else pd.Series(dtype=int), threshold)
+
+    def top_errors(self, n=TOP_ERRORS):
+        """Messages d'intégration les plus fréquents parmi les KO"""
+        return self.errors.sort_values(ascending=False, kind='stable').head(n) if self.errors is not None else pd.Series(dtype=int)
+
+def _conform(df, cols):
+    df = df.copy()
+    for c in cols:
+        if c not in df.columns and c not in DERIVED_COLS: df[c] = ''
+    if any(c not in df.columns for c in DERIVED_COLS if c in cols): derive(df)
+    return df[cols]
+
+def concat_clean(a, b):
+    """Concatène deux jeux nettoyés en gardant le type des colonnes de a : une colonne catégorielle de a reste
+    catégorielle (union des modalités) tant qu'elle respecte CATEGORY_MAX_RATIO, les autres gardent leur type
+    même si le delta, plus petit, a été typé en catégorie"""
+    cols = list(dict.fromkeys([*a.columns, *b.columns]))
+    a, b = _conform(a, cols), _conform(b, cols)
+    out = {}
+    for c in cols:
+        x, y = a[c], b[c]
+        if isinstance(x.dtype, pd.CategoricalDtype):
+            s = pd.Series(union_categoricals([x, y.astype('category')], ignore_order=True))
+            out[c] = s if s.nunique() <= CATEGORY_MAX_RATIO * len(s) else s.astype(str)
+        else:
+            out[c] = pd.concat([x, y.astype(x.dtype) if isinstance(y.dtype, pd.CategoricalDtype) else y], ignore_index=True)
+    return pd.DataFrame(out)
+
+def merge_delta(df, delta, agg=None):
+    """Ajoute à df les lignes nettoyées de delta absentes (clé Contrat + Date_Integration).
+    Renvoie (DataFrame fusionné, agrégats mis à jour, lignes ajoutées) ; agg (agrégats de df) évite de les recalculer"""
+    agg = agg or Aggregates.from_frame(df)
+    new = agg.new_rows(delta)
+    return concat_clean(df, new), agg.plus(new), len(new)
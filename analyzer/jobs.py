@@ -0,0 +1,126 @@
+"""Tâches longues exécutées hors du thread du script (rapport Excel, scores hybrides...).
+Une tâche est identifiée par une clé : les demandes identiques en cours, ou déjà terminées et encore en mémoire,
+sont partagées entre sessions. L'annulation est coopérative : la fonction appelle job.report(), qui lève
+JobCancelled lorsque plus aucune session n'attend le résultat"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .settings import env_number
+
+JOB_WORKERS = env_number('ANALYZER_JOB_WORKERS', 2, int)
+# Résultats de tâches terminées conservés (LRU) pour les demandes suivantes
+JOB_KEEP_DONE = 8
+
+PENDING, RUNNING, DONE, CANCELLED, FAILED = 'en attente', 'en cours', 'terminé', 'annulé', 'erreur'
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """Une tâche : état, progression (0 à 1), message, résultat ou erreur.
+    subscribers : nombre de sessions qui attendent le résultat"""
+    def __init__(self, key):
+        self.key = key
+        self.status = PENDING
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.subscribers = 1
+        self.started = self.finished = None
+        self.created = time.time()
+        self.future = None
+        self._cancel = threading.Event()
+
+    def report(self, n, total=None, message=None):
+        """Progression (n / total, ou fraction si total est None) ; lève JobCancelled si la tâche est annulée"""
+        if self._cancel.is_set(): raise JobCancelled(self.key)
+        self.progress = min(n / total, 1.0) if total else (n if total is None else 1.0)
+        if message is not None: self.message = message
+
+    def progress_fn(self, message=None):
+        """Rappel (n, total) au format de read_workbook / create_excel"""
+        return lambda n, total: self.report(n, total, message)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self.status in (DONE, CANCELLED, FAILED)
+
+    def wait(self, timeout=None):
+        """Attend la fin de la tâche au plus timeout secondes ; renvoie done"""
+        if self.future is not None: wait([self.future], timeout)
+        return self.done
+
+    def elapsed(self):
+        return ((self.finished or time.time()) - self.started) if self.started else 0.0
+
+    def state(self):
+        """Instantané sérialisable (pour st.session_state)"""
+        return {'cle': self.key, 'etat': self.status, 'progression': round(self.progress, 3), 'message': self.message,
+                'duree_s': round(self.elapsed(), 2), 'erreur': None if self.error is None else repr(self.error)}
+
+    def _run(self, fn, args, kwargs):
+        if self._cancel.is_set():
+            self.status = CANCELLED
+            return
+        self.status, self.started = RUNNING, time.time()
+        try:
+            self.result = fn(self, *args, **kwargs)
+            self.status, self.progress = DONE, 1.0
+        except JobCancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            self.status, self.error = FAILED, e
+        finally:
+            self.finished = time.time()
+
+class JobRunner:
+    """Pool de threads partagé par le processus ; fn(job, *args) exécuté une fois par clé"""
+    def __init__(self, workers=JOB_WORKERS, keep_done=JOB_KEEP_DONE):
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix='analyzer-job')
+        self.keep_done = keep_done
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Lance la tâche key, ou rejoint celle en cours / déjà terminée (une tâche annulée ou en erreur est relancée)"""
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is not None and job.status not in (CANCELLED, FAILED) and not job.cancelled:
+                job.subscribers += 1
+                self.jobs.move_to_end(key)
+                return job
+            job = self.jobs[key] = Job(key)
+            job.future = self.pool.submit(job._run, fn, args, kwargs)
+            self._prune()
+            return job
+
+    def get(self, key):
+        with self.lock:
+            return self.jobs.get(key)
+
+    def release(self, key):
+        """La session n'attend plus key : la tâche est annulée si plus personne ne l'attend et qu'elle n'est pas finie"""
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None: return
+            job.subscribers = max(job.subscribers - 1, 0)
+            if job.subscribers == 0 and not job.done:
+                job._cancel.set()
+                if job.future.cancel(): job.status = CANCELLED
+
+    def _prune(self):
+        done = [k for k, j in self.jobs.items() if j.done]
+        for k in done[:max(len(done) - self.keep_done, 0)]:
+            del self.jobs[k]
+
+    def snapshot(self):
+        """États de toutes les tâches connues (plus récentes en dernier)"""
+        with self.lock:
+            return [dict(j.state(), sessions=j.subscribers) for j in self.jobs.values()]
@@ -0,0 +1,29 @@
+"""Agrégats partagés par le dashboard, les graphiques et l'export"""
+import numpy as np
+import pandas as pd
+
+from .data import ok_mask, date_col
+
+def agency_metrics(df, decimals=2):
+    """Métriques par agence en un seul groupby : Total/OK/KO/Taux, écart à la moyenne, rang et statut"""
+    ok = ok_mask(df)
+    g = ok.groupby(df['Code_Unite'], sort=False, dropna=False)
+    return agency_table(g.size(), g.sum(), decimals)
+
+def agency_table(total, ok, decimals=2):
+    """Tableau agences à partir des comptages Total et OK indexés par agence"""
+    ag = pd.DataFrame({'Total': total, 'OK': ok}).rename_axis('Agence').reset_index()
+    ag['KO'] = ag['Total'] - ag['OK']
+    ag['Taux'] = (ag['OK'] / ag['Total'] * 100).round(decimals)
+    moy = ag['Taux'].mean()
+    ag['Écart vs Moyenne'] = (ag['Taux'] - moy).round(1)
+    ag['Rang'] = ag['Taux'].rank(ascending=False, method='min').astype(int)
+    ag['Statut'] = np.select([ag['Taux']>=80, ag['Taux']>=60], ['🟢 Excellent','🟡 Moyen'], '🔴 Critique')
+    return ag
+
+def temporal_metrics(df):
+    """Volumes par jour et par mois sur les dates d'intégration valides : (daily, monthly)"""
+    dates = date_col(df).dropna()
+    daily = dates.dt.date.rename('Date').to_frame().groupby('Date').size().reset_index(name='Nombre')
+    monthly = dates.dt.to_period('M').astype(str).rename('Mois').to_frame().groupby('Mois').size().reset_index(name='Nombre')
+    return daily, monthly
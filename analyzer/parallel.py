@@ -0,0 +1,48 @@
+"""Exécution parallèle par lots : découpe le travail en lots, les répartit sur un pool de processus et
+fusionne les résultats dans l'ordre d'entrée (résultat identique à l'exécution en série)"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .settings import env_number
+
+PARALLEL_WORKERS = env_number('ANALYZER_WORKERS', os.cpu_count() or 1, int)
+PARALLEL_CHUNK = env_number('ANALYZER_CHUNK', 2000, int)
+# En dessous, le coût de démarrage du pool dépasse le gain
+MIN_PARALLEL_ITEMS = 10000
+
+# État partagé d'un processus de travail (index, requête...), installé une fois par processus
+_STATE = {}
+# État de l'exécution en série, propre au thread appelant (sessions et tâches de fond partagent le processus)
+_LOCAL = threading.local()
+
+def _init(state):
+    _STATE.clear()
+    _STATE.update(state)
+
+def worker_state():
+    state = getattr(_LOCAL, 'state', None)
+    return _STATE if state is None else state
+
+def chunks(items, size):
+    return [items[i:i+size] for i in range(0, len(items), size)]
+
+def map_chunks(fn, items, state=None, workers=None, chunk_size=None, min_items=MIN_PARALLEL_ITEMS):
+    """Applique fn (fonction de module) à chaque lot de items ; renvoie la liste des résultats par lot, dans l'ordre.
+    state : dictionnaire accessible via worker_state() (copié une fois par processus) ;
+    exécution en série si workers <= 1, si items est petit ou si le pool ne peut pas démarrer"""
+    workers = PARALLEL_WORKERS if workers is None else workers
+    parts = chunks(items, chunk_size or PARALLEL_CHUNK)
+    if workers > 1 and len(items) >= min_items and len(parts) > 1:
+        try:
+            with ProcessPoolExecutor(min(workers, len(parts)), initializer=_init, initargs=(state or {},)) as pool:
+                return list(pool.map(fn, parts))
+        except (OSError, BrokenProcessPool):
+            pass
+    saved = getattr(_LOCAL, 'state', None)
+    _LOCAL.state = state or {}
+    try:
+        return [fn(p) for p in parts]
+    finally:
+        _LOCAL.state = saved
@@ -0,0 +1,108 @@
+"""Instrumentation des étapes coûteuses : durée, mémoire (RSS et pic tracemalloc) et journal JSON.
+Désactivé, stage() renvoie un contexte vide partagé : le coût se limite à un appel de fonction"""
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+PROFILE_ENABLED = os.environ.get('ANALYZER_PROFILE', '') not in ('', '0')
+PROFILE_LOG = os.environ.get('ANALYZER_PROFILE_LOG', '')
+# Pic d'allocation par étape (tracemalloc) : réglage du processus, coûteux, à réserver au diagnostic
+PROFILE_MEMORY = os.environ.get('ANALYZER_PROFILE_MEMORY', '') not in ('', '0')
+
+logger = logging.getLogger('analyzer.profiling')
+_NULL = nullcontext()
+_PAGE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def rss_mb():
+    """Mémoire résidente actuelle du processus (Mo) ; pic depuis le démarrage si /proc est indisponible"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# tracemalloc est global au processus (sessions, tâches de fond, étapes imbriquées) : avant chaque remise à zéro
+# du pic, celui-ci est reporté sur toutes les étapes en cours, qui gardent ainsi chacune leur propre maximum
+_trace_lock = threading.Lock()
+_active = set()
+
+def memory_tracing():
+    """Démarre tracemalloc pour tout le processus (une seule fois, aucune session ne l'arrête) ;
+    renvoie True si cet appel l'a démarré"""
+    with _trace_lock:
+        if tracemalloc.is_tracing(): return False
+        tracemalloc.start()
+        return True
+
+def _fold_peak():
+    peak = tracemalloc.get_traced_memory()[1]
+    for s in _active: s.peak = max(s.peak, peak)
+    tracemalloc.reset_peak()
+
+class _Stage:
+    def __init__(self, prof, name):
+        self.prof, self.name = prof, name
+        self.base = None
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            with _trace_lock:
+                _fold_peak()
+                self.base = self.peak = tracemalloc.get_traced_memory()[0]
+                _active.add(self)
+        self.rss = rss_mb()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter()
+        rec = {'etape': self.name, 'debut_ms': round((self.t0 - self.prof.t0) * 1000, 2),
+               'duree_ms': round((t1 - self.t0) * 1000, 2), 'rss_mo': round(rss_mb(), 1),
+               'rss_delta_mo': round(rss_mb() - self.rss, 1)}
+        if self.base is not None:
+            with _trace_lock:
+                if tracemalloc.is_tracing(): _fold_peak()
+                _active.discard(self)
+            # Pic au-dessus de la mémoire tracée à l'entrée de l'étape
+            rec['pic_alloc_mo'] = round((self.peak - self.base) / 2**20, 1)
+        if exc[0] is not None: rec['erreur'] = exc[0].__name__
+        self.prof.records.append(rec)
+        return False
+
+class Profiler:
+    """Mesures d'une exécution (un rerun de l'application, un lot du CLI...).
+    Le pic d'allocation par étape est relevé quand tracemalloc tourne (PROFILE_MEMORY ou memory_tracing())"""
+    def __init__(self, enabled=PROFILE_ENABLED, **context):
+        self.enabled = enabled
+        self.context = context
+        self.records = []
+        self.t0 = time.perf_counter()
+
+    def stage(self, name):
+        return _Stage(self, name) if self.enabled else _NULL
+
+    def total_ms(self):
+        return round((time.perf_counter() - self.t0) * 1000, 2)
+
+    def emit(self, path=PROFILE_LOG):
+        """Journal structuré : une ligne JSON par exécution (logger analyzer.profiling, et fichier si path)"""
+        if not self.enabled: return None
+        line = json.dumps({'ts': time.time(), **self.context, 'total_ms': self.total_ms(), 'etapes': self.records},
+                          default=str, ensure_ascii=False)
+        logger.info(line)
+        if path:
+            with open(path, 'a', encoding='utf-8') as f: f.write(line + '\n')
+        return line
+
+_DISABLED = Profiler(False)
+
+if PROFILE_MEMORY: memory_tracing()
+
+def stage(prof, name):
+    """prof.stage(name), ou un contexte vide si prof est None"""
+    return (prof or _DISABLED).stage(name)
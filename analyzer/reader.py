@@ -0,0 +1,69 @@
+"""Lecture des classeurs : moteur rapide (calamine) si disponible, sinon openpyxl, avec projection de colonnes"""
+import io
+from datetime import date, timedelta
+from importlib.util import find_spec
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# Colonnes utilisées par les analyses
+ANALYSIS_COLS = ['Contrat', 'Code_Unite', 'Statut_Final', 'Initial/Avenant', 'Type (libellé)',
+                 'Date_Integration', 'Message_Integration']
+READ_CHUNK_ROWS = 10000
+
+HAS_CALAMINE = find_spec('python_calamine') is not None
+
+def default_engine(name=''):
+    if HAS_CALAMINE: return 'calamine'
+    return 'xlrd' if str(name).lower().endswith('.xls') else 'openpyxl'
+
+def _rows_calamine(buf):
+    from python_calamine import CalamineWorkbook
+    sheet = CalamineWorkbook.from_filelike(buf).get_sheet_by_index(0)
+    return sheet.height, sheet.iter_rows()
+
+def _rows_openpyxl(buf):
+    ws = load_workbook(buf, read_only=True, data_only=True).worksheets[0]
+    return ws.max_row, ws.iter_rows(values_only=True)
+
+ROW_READERS = {'calamine': _rows_calamine, 'openpyxl': _rows_openpyxl}
+
+def _cell(v):
+    # Mêmes conversions que pd.read_excel (lecteur calamine de pandas) : vide -> NaN, flottant entier -> int,
+    # date / datetime -> Timestamp (calamine renvoie des date pour les cellules sans heure), durée -> Timedelta ;
+    # les heures (time) restent telles quelles
+    if v is None or v == '': return None
+    if isinstance(v, float): return int(v) if v.is_integer() else v
+    if isinstance(v, date): return pd.Timestamp(v)
+    if isinstance(v, timedelta): return pd.Timedelta(v)
+    return v
+
+def _header(names):
+    seen, out = {}, []
+    for n in names:
+        n = '' if n is None else str(n)
+        k = seen.get(n, 0)
+        seen[n] = k + 1
+        out.append(f"{n}.{k}" if k else n)
+    return out
+
+def read_workbook(data, columns=ANALYSIS_COLS, engine=None, progress=None, name='', chunk_rows=READ_CHUNK_ROWS):
+    """Lit la première feuille d'un classeur (bytes).
+    columns : colonnes à garder (None = toutes ; si aucune n'est présente, tout est chargé)
+    progress : fonction (lignes lues, lignes totales) appelée tous les chunk_rows lignes"""
+    engine = engine or default_engine(name)
+    if engine not in ROW_READERS:
+        return pd.read_excel(io.BytesIO(data), engine=engine, usecols=(lambda c: str(c).strip() in columns) if columns else None)
+    total, rows = ROW_READERS[engine](io.BytesIO(data))
+    header = _header(next(rows, []))
+    keep = [i for i,c in enumerate(header) if columns is None or c.strip() in columns]
+    if not keep: keep = list(range(len(header)))
+    cols = [[] for _ in keep]
+    n = 0
+    for row in rows:
+        for j,i in enumerate(keep):
+            cols[j].append(_cell(row[i]) if i < len(row) else None)
+        n += 1
+        if progress and n % chunk_rows == 0: progress(n, max((total or 0) - 1, n))
+    if progress: progress(n, n)
+    return pd.DataFrame({header[i]: col for i,col in zip(keep, cols)})
@@ -0,0 +1,95 @@
+"""Rapprochement de fichiers : jointure par hachage sur le numéro de contrat normalisé, repli flou avec blocage des candidats"""
+import numpy as np
+import pandas as pd
+
+from .blocking import BlockingConfig, BlockingIndex, all_matches
+from .data import visible
+
+KEY_COL = 'Contrat'
+FUZZY_THRESHOLD = 90
+SIDES = ('Excel', 'Pixid')
+SUFFIXES = tuple(f' [{s}]' for s in SIDES)
+
+def normalize_key(s):
+    """Clé de rapprochement : majuscules, sans séparateurs ni suffixe '.0' des numéros lus comme nombres"""
+    s = s.astype(str).str.strip().str.upper()
+    return s.str.replace(r'\.0$', '', regex=True).str.replace(r'[^0-9A-Z]', '', regex=True)
+
+def _prepare(df, key):
+    """Une ligne par clé (la dernière), avec le nombre de lignes d'origine"""
+    df = visible(df)
+    df = df.assign(_cle=normalize_key(df[key]))
+    df = df[df['_cle'] != '']
+    n = df['_cle'].value_counts()
+    df = df.drop_duplicates('_cle', keep='last')
+    return df.assign(_lignes=df['_cle'].map(n).to_numpy())
+
+def fuzzy_pairs(left_keys, right_keys, threshold=FUZZY_THRESHOLD, blocking=None, workers=None):
+    """Appariement flou 1-1 des clés restantes ; seuls les candidats retenus par le blocage sont scorés
+    (blocking : BlockingConfig, par défaut filtres exacts au seuil donné). Le scoring est réparti sur
+    workers processus, l'affectation (chaque clé prend son meilleur candidat encore libre) reste séquentielle"""
+    cfg = blocking or BlockingConfig(threshold)
+    left_keys, right_keys = list(left_keys), list(right_keys)
+    index = BlockingIndex(right_keys, cfg)
+    matches, _ = all_matches(left_keys, index, workers)
+    used, pairs = np.zeros(len(right_keys), dtype=bool), []
+    for k, m in zip(left_keys, matches):
+        for i, score in m:
+            if not used[i]:
+                used[i] = True
+                pairs.append((k, right_keys[i], int(round(score))))
+                break
+    return pairs
+
+class Reconciliation:
+    """Résultat d'un rapprochement : lignes appariées, présentes d'un seul côté, et écarts de valeurs"""
+    def __init__(self, matched, left_only, right_only, conflicts):
+        self.matched = matched
+        self.left_only = left_only
+        self.right_only = right_only
+        self.conflicts = conflicts
+
+    def stats(self):
+        return {'Appariés (exact)': int((self.matched['Rapprochement'] == 'exact').sum()),
+                'Appariés (flou)': int((self.matched['Rapprochement'] == 'flou').sum()),
+                f'Seulement {SIDES[0]}': len(self.left_only),
+                f'Seulement {SIDES[1]}': len(self.right_only),
+                'Écarts de valeurs': len(self.conflicts)}
+
+def _conflicts(matched, columns):
+    out = []
+    for c in columns:
+        lv = matched[c + SUFFIXES[0]].astype(str).str.strip()
+        rv = matched[c + SUFFIXES[1]].astype(str).str.strip()
+        diff = (lv != rv).to_numpy()
+        if diff.any():
+            out.append(pd.DataFrame({'Clé': matched['_cle'].to_numpy()[diff], 'Champ': c,
+                                     f'Valeur {SIDES[0]}': lv.to_numpy()[diff], f'Valeur {SIDES[1]}': rv.to_numpy()[diff]}))
+    return pd.concat(out, ignore_index=True) if out else pd.DataFrame(columns=['Clé','Champ',*(f'Valeur {s}' for s in SIDES)])
+
+def reconcile(left, right, key=KEY_COL, fuzzy=True, threshold=FUZZY_THRESHOLD, compare=None, blocking=None):
+    """Rapproche deux jeux de données sur la clé normalisée (jointure par hachage, temps linéaire).
+    Les clés sans correspondance exacte sont appariées par similarité si fuzzy ; compare : colonnes
+    dont les écarts sont signalés (par défaut toutes les colonnes communes hors clé) ;
+    blocking : BlockingConfig (taille des q-grammes, blocage par préfixe) de l'appariement flou"""
+    l, r = _prepare(left, key), _prepare(right, key)
+    in_r = l['_cle'].isin(r['_cle'])
+    in_l = r['_cle'].isin(l['_cle'])
+    matched = l[in_r].merge(r, on='_cle', suffixes=SUFFIXES).assign(Rapprochement='exact', Score=100)
+    left_only, right_only = l[~in_r], r[~in_l]
+
+    if fuzzy and len(left_only) and len(right_only):
+        pairs = fuzzy_pairs(left_only['_cle'], right_only['_cle'], threshold, blocking)
+        if pairs:
+            p = pd.DataFrame(pairs, columns=['_cle', '_cle_d', 'Score'])
+            fm = (left_only.merge(p, on='_cle')
+                  .merge(right_only.rename(columns={'_cle': '_cle_d'}), on='_cle_d', suffixes=SUFFIXES)
+                  .drop(columns='_cle_d').assign(Rapprochement='flou'))
+            matched = pd.concat([matched, fm], ignore_index=True)
+            left_only = left_only[~left_only['_cle'].isin(p['_cle'])]
+            right_only = right_only[~right_only['_cle'].isin(p['_cle_d'])]
+
+    if compare is None:
+        compare = [c for c in visible(left).columns if c in visible(right).columns and c != key]
+    conflicts = _conflicts(matched, [c for c in compare if c + SUFFIXES[0] in matched.columns])
+    return Reconciliation(matched, left_only, right_only, conflicts)
@@ -0,0 +1,133 @@
+"""Registre des jeux de données partagé par les sessions d'un même processus.
+Chaque jeu (clé : hash du contenu) regroupe des parties en lecture seule (données nettoyées, agrégats, index...).
+Les sessions qui l'utilisent le référencent ; au-delà du budget mémoire, les parties des jeux qui ne sont plus
+référencés sont évincées, les moins récemment utilisées d'abord"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .settings import env_mb
+
+REGISTRY_MAX_BYTES = env_mb('ANALYZER_REGISTRY_MB', 2048)
+# Une session sans activité depuis SESSION_TTL secondes ne retient plus ses jeux
+SESSION_TTL = 30 * 60
+
+def nbytes(obj, _depth=0):
+    """Taille mémoire approximative d'un objet (DataFrame, Series, tableaux, conteneurs, attributs d'objets)"""
+    if isinstance(obj, pd.DataFrame): return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)): return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray): return int(obj.nbytes)
+    if _depth > 3: return sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list, set, frozenset)): return sys.getsizeof(obj) + sum(nbytes(x, _depth+1) for x in obj)
+    if isinstance(obj, dict): return sys.getsizeof(obj) + sum(nbytes(k, _depth+1) + nbytes(v, _depth+1) for k, v in obj.items())
+    if hasattr(obj, '__dict__'): return nbytes(vars(obj), _depth+1)
+    return sys.getsizeof(obj)
+
+class _Entry:
+    def __init__(self, value, size, name):
+        self.value = value
+        self.size = size
+        self.name = name
+        self.loaded = self.used = time.time()
+        self.hits = 0
+
+class DatasetRegistry:
+    """Parties de jeux de données, indexées par (jeu, partie), chargées une seule fois par processus.
+    attach(session, jeux) déclare les jeux utilisés par une session : ils ne sont jamais évincés tant qu'elle les garde"""
+    def __init__(self, max_bytes=REGISTRY_MAX_BYTES, session_ttl=SESSION_TTL):
+        self.max_bytes = max_bytes
+        self.session_ttl = session_ttl
+        self.entries = OrderedDict()
+        self.sessions = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, dataset, part, loader, name=None):
+        """Valeur de (dataset, part) ; loader() n'est appelé qu'une fois, les sessions concurrentes attendent son résultat"""
+        key = (dataset, part)
+        with self.lock:
+            e = self.entries.get(key)
+            if e is not None:
+                return self._hit(key, e)
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        with load_lock:
+            with self.lock:
+                e = self.entries.get(key)
+                if e is not None:
+                    return self._hit(key, e)
+            value = loader()
+            e = _Entry(value, nbytes(value), name or self._name(dataset))
+            with self.lock:
+                self.misses += 1
+                self.entries[key] = e
+                self._loading.pop(key, None)
+                # La partie tout juste chargée reste résidente jusqu'au prochain attach() de la session
+                self._evict(keep=key)
+        return value
+
+    def _hit(self, key, e):
+        self.entries.move_to_end(key)
+        e.used = time.time()
+        e.hits += 1
+        self.hits += 1
+        return e.value
+
+    def _name(self, dataset):
+        return next((e.name for (d, _), e in self.entries.items() if d == dataset and e.name), '')
+
+    def attach(self, session, datasets):
+        """Jeux utilisés par la session (remplace la déclaration précédente) ; vaut signe de vie"""
+        with self.lock:
+            self.sessions[session] = (set(datasets), time.time())
+            self._evict()
+
+    def detach(self, session):
+        with self.lock:
+            self.sessions.pop(session, None)
+            self._evict()
+
+    def refs(self):
+        """Nombre de sessions actives par jeu"""
+        limit = time.time() - self.session_ttl
+        counts = {}
+        for datasets, seen in self.sessions.values():
+            if seen < limit: continue
+            for d in datasets: counts[d] = counts.get(d, 0) + 1
+        return counts
+
+    def size(self):
+        return sum(e.size for e in self.entries.values())
+
+    def _evict(self, max_bytes=None, keep=None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        limit = time.time() - self.session_ttl
+        self.sessions = {s: v for s, v in self.sessions.items() if v[1] >= limit}
+        used = self.refs()
+        total = self.size()
+        for key in list(self.entries):
+            if total <= max_bytes: break
+            if key[0] in used or key == keep: continue
+            total -= self.entries.pop(key).size
+            self.evictions += 1
+
+    def trim(self):
+        """Évince tout ce qu'aucune session n'utilise"""
+        with self.lock:
+            self._evict(0)
+
+    def report(self):
+        """Contenu résident : une ligne par partie, des plus récemment utilisées aux plus anciennes"""
+        with self.lock:
+            refs = self.refs()
+            rows = [{'Jeu': e.name or d[:12], 'Clé': d[:12], 'Partie': p, 'Taille (Mo)': round(e.size / 2**20, 1),
+                     'Sessions': refs.get(d, 0), 'Accès': e.hits, 'Chargé': time.strftime('%H:%M:%S', time.localtime(e.loaded)),
+                     'Dernier accès': time.strftime('%H:%M:%S', time.localtime(e.used))}
+                    for (d, p), e in reversed(self.entries.items())]
+        return pd.DataFrame(rows, columns=['Jeu', 'Clé', 'Partie', 'Taille (Mo)', 'Sessions', 'Accès', 'Chargé', 'Dernier accès'])
@@ -0,0 +1,240 @@
+"""Recherche : requêtes en langage naturel, score hybride, recherche floue et index des contrats"""
+import numpy as np
+import pandas as pd
+from thefuzz import fuzz, process
+from thefuzz.utils import full_process
+from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+
+from .data import ok_mask, date_col, DERIVED_COLS
+from .parallel import map_chunks, worker_state, PARALLEL_CHUNK, PARALLEL_WORKERS
+
+# Taille des paquets de calc_scores lorsque la progression est suivie
+SCORE_CHUNK_ROWS = 50000
+
+def parse_nl_query(query, df):
+    filters = {}
+    q = query.lower()
+    if any(w in q for w in ['ko','échec','erreur','rejet']): filters['statut'] = 'KO'
+    elif any(w in q for w in ['ok','réussi','succès']): filters['statut'] = 'OK'
+    if 'Code_Unite' in df.columns:
+        for ag in df['Code_Unite'].unique():
+            if str(ag).lower() in q: filters['agence'] = ag; break
+    mois = {'janvier':1,'jan':1,'février':2,'fev':2,'mars':3,'avril':4,'mai':5,'juin':6,'juillet':7,'août':8,'aout':8,'septembre':9,'sept':9,'octobre':10,'novembre':11,'décembre':12,'dec':12}
+    for n,m in mois.items():
+        if n in q: filters['mois'] = m; break
+    if 'initial' in q: filters['init_avenant'] = 'Initial'
+    elif 'avenant' in q: filters['init_avenant'] = 'Avenant'
+    return filters
+
+def _ascii_process(s):
+    # Prétraitement de thefuzz pour token_sort_ratio (minuscules, ASCII, ponctuation retirée)
+    return full_process(s, force_ascii=True)
+
+def _extract_chunk(vals):
+    st = worker_state()
+    scores = rf_process.cdist([st['query']], vals, scorer=rf_fuzz.token_sort_ratio, processor=_ascii_process, workers=1)[0]
+    top = np.lexsort((np.arange(len(vals)), -scores))[:st['lim']]
+    return [(vals[i], float(scores[i]), int(i)) for i in top]
+
+def extract(query, vals, lim=10, workers=None, chunk_size=None):
+    """Équivalent de process.extract (token_sort_ratio) réparti par lots sur un pool de processus.
+    Départage explicite (score non arrondi, puis ordre d'origine) : le résultat ne dépend ni des lots ni des processus"""
+    parts = map_chunks(_extract_chunk, vals, {'query': query, 'lim': lim}, workers, chunk_size)
+    size = chunk_size or PARALLEL_CHUNK
+    found = sorted(((m[1], n*size + m[2], m[0]) for n, part in enumerate(parts) for m in part), key=lambda m: (-m[0], m[1]))
+    return [(v, int(round(s))) for s, _, v in found[:lim]]
+
+def fuzzy_search(query, df, col, lim=10, index=None, workers=None):
+    if col not in df.columns: return []
+    if index is not None and query.strip():
+        return [(m[0],m[1]) for m in process.extract(query,index.candidates(query),limit=lim,scorer=fuzz.token_sort_ratio) if m[1]>50]
+    vals = [v for v in df[col].dropna().astype(str).unique() if v.strip()]
+    if not vals or not query.strip(): return []
+    return [(m[0],m[1]) for m in extract(query,vals,lim,workers) if m[1]>50]
+
+def calc_score(row, query, filters):
+    score = 0
+    if 'Contrat' in row.index:
+        if query.lower() in str(row['Contrat']).lower(): score += 100
+        else: score += fuzz.partial_ratio(query.lower(), str(row['Contrat']).lower()) * 0.5
+    if filters.get('agence') and row.get('Code_Unite') == filters['agence']: score += 50
+    if filters.get('statut'):
+        if filters['statut']=='KO' and str(row.get('Statut_Final','')).upper()!='OK': score += 50
+        elif filters['statut']=='OK' and str(row.get('Statut_Final','')).upper()=='OK': score += 50
+    if filters.get('mois'):
+        try:
+            if pd.to_datetime(row.get('Date_Integration')).month == filters['mois']: score += 40
+        except: pass
+    return score
+
+def calc_scores(df, query, filters, progress=None, chunk_rows=SCORE_CHUNK_ROWS):
+    """Version vectorisée de calc_score : mêmes scores, calculés par colonnes.
+    progress : fonction (lignes traitées, lignes totales) ; le calcul se fait alors par paquets de chunk_rows lignes"""
+    if progress is not None:
+        parts = []
+        for i in range(0, len(df), chunk_rows):
+            parts.append(calc_scores(df.iloc[i:i+chunk_rows], query, filters))
+            progress(min(i+chunk_rows, len(df)), len(df))
+        return pd.concat(parts) if parts else pd.Series(0.0, index=df.index)
+    score = pd.Series(0.0, index=df.index)
+    if 'Contrat' in df.columns:
+        q = query.lower()
+        # str() valeur par valeur comme calc_score (None -> 'none', NaN -> 'nan'), puis calcul sur les valeurs distinctes
+        codes, uniq = pd.factorize(df['Contrat'].astype(object).map(str))
+        keys = pd.Series(uniq, dtype=object).str.lower()
+        hit = keys.str.contains(q, regex=False).to_numpy(bool)
+        part = np.where(hit, 100.0, 0.0)
+        miss = np.flatnonzero(~hit)
+        if len(miss):
+            part[miss] = np.rint(rf_process.cdist([q], keys.iloc[miss].tolist(), scorer=rf_fuzz.partial_ratio, workers=PARALLEL_WORKERS)[0]) * 0.5
+        score += part[codes]
+    if filters.get('agence') and 'Code_Unite' in df.columns:
+        score[(df['Code_Unite'] == filters['agence']).to_numpy()] += 50
+    if filters.get('statut'):
+        ok = ok_mask(df).to_numpy() if 'Statut_Final' in df.columns else np.zeros(len(df), dtype=bool)
+        if filters['statut'] == 'KO': score[~ok] += 50
+        elif filters['statut'] == 'OK': score[ok] += 50
+    if filters.get('mois') and 'Date_Integration' in df.columns:
+        score[(date_col(df).dt.month == filters['mois']).to_numpy()] += 40
+    return score
+
+def get_suggestions(inp, df, lim=5, index=None):
+    if not inp or len(inp)<2: return []
+    sugg = []
+    if index is not None:
+        for c in index.suggest(inp, lim):
+            sugg.append({'type':'📄 Contrat','value':c,'score':fuzz.partial_ratio(inp.lower(),c.lower())})
+    elif 'Contrat' in df.columns:
+        for c in df['Contrat'].dropna().astype(str)[df['Contrat'].astype(str).str.contains(inp,case=False,na=False)].head(lim):
+            sugg.append({'type':'📄 Contrat','value':c,'score':fuzz.partial_ratio(inp.lower(),c.lower())})
+    if 'Code_Unite' in df.columns:
+        for ag in (index.agences if index is not None else df['Code_Unite'].unique()):
+            if inp.lower() in str(ag).lower(): sugg.append({'type':'🏢 Agence','value':ag,'score':100})
+    if 'ko' in inp.lower(): sugg.append({'type':'❌ Statut','value':'KO','score':100})
+    if 'ok' in inp.lower(): sugg.append({'type':'✅ Statut','value':'OK','score':100})
+    return sorted(sugg, key=lambda x:x['score'], reverse=True)[:lim]
+
+NGRAM = 3
+MAX_CANDIDATES = 500
+
+class ContractIndex:
+    """Index des numéros de contrat : tableau trié pour les préfixes + index inversé de n-grammes"""
+    def __init__(self, df, col='Contrat'):
+        vals = df[col].dropna().astype(str) if col in df.columns else pd.Series([], dtype=str)
+        vals = vals[vals.str.strip() != ''].unique()
+        self.values = np.asarray(vals, dtype=object)
+        self.keys = pd.Series(self.values, dtype=object).str.lower()
+        self.order = np.argsort(self.keys.to_numpy(), kind='stable')
+        self.sorted_keys = self.keys.to_numpy()[self.order]
+        self.grams = self._build_grams(self.keys)
+        self.agences = df['Code_Unite'].unique() if 'Code_Unite' in df.columns else []
+
+    @staticmethod
+    def _build_grams(keys):
+        lens = keys.str.len().to_numpy()
+        g, ids = [], []
+        for j in range(int(lens.max()) - NGRAM + 1 if len(keys) else 0):
+            ok = np.flatnonzero(lens >= j + NGRAM)
+            g.append(keys.iloc[ok].str.slice(j, j + NGRAM).to_numpy(dtype=object))
+            ids.append(ok)
+        if not g: return {}
+        pairs = pd.DataFrame({'g': np.concatenate(g), 'i': np.concatenate(ids)}).drop_duplicates()
+        i = pairs['i'].to_numpy()
+        return {k: np.sort(i[pos]) for k, pos in pairs.groupby('g', sort=False).indices.items()}
+
+    def __len__(self):
+        return len(self.values)
+
+    def prefix(self, q, lim):
+        q = q.lower()
+        lo = np.searchsorted(self.sorted_keys, q, 'left')
+        hi = np.searchsorted(self.sorted_keys, q + '\uffff', 'left')
+        return np.sort(self.order[lo:hi])[:lim]
+
+    def contains(self, q, lim):
+        q = q.lower()
+        if len(q) < NGRAM:
+            return np.flatnonzero(self.keys.str.contains(q, regex=False).to_numpy())[:lim]
+        grams = {q[j:j+NGRAM] for j in range(len(q) - NGRAM + 1)}
+        if any(g not in self.grams for g in grams): return np.array([], dtype=int)
+        cand = None
+        for g in sorted(grams, key=lambda g: len(self.grams[g])):
+            cand = self.grams[g] if cand is None else np.intersect1d(cand, self.grams[g], assume_unique=True)
+        keys = self.keys.to_numpy()
+        out = []
+        for i in cand:
+            if q in keys[i]:
+                out.append(i)
+                if len(out) >= lim: break
+        return np.array(out, dtype=int)
+
+    def suggest(self, q, lim):
+        ids = list(dict.fromkeys([*self.prefix(q, lim), *self.contains(q, lim)]))[:lim]
+        return list(self.values[ids]) if ids else []
+
+    def candidates(self, q, max_candidates=MAX_CANDIDATES):
+        """Contrats partageant le plus de n-grammes avec la requête (tous si la requête est trop courte)"""
+        q = q.lower()
+        if len(q) < NGRAM or len(self.values) <= max_candidates: return list(self.values)
+        lists = [self.grams[q[j:j+NGRAM]] for j in range(len(q) - NGRAM + 1) if q[j:j+NGRAM] in self.grams]
+        if not lists: return []
+        ids, counts = np.unique(np.concatenate(lists), return_counts=True)
+        if len(ids) > max_candidates:
+            ids = np.sort(ids[np.argpartition(-counts, max_candidates)[:max_candidates]])
+        return list(self.values[ids])
+
+class QueryIndex:
+    """Colonnes précalculées pour filtrer sans copier : statut, codes agence, mois, et texte en minuscules
+    (catégories pour les colonnes catégorielles, une colonne concaténée pour les autres)"""
+    SEP = '\x1f'
+
+    def __init__(self, df):
+        self.n = len(df)
+        self.ok = ok_mask(df).to_numpy() if 'Statut_Final' in df.columns else None
+        self.n_ok = int(self.ok.sum()) if self.ok is not None else 0
+        if 'Code_Unite' in df.columns:
+            self.agence_codes, agences = pd.factorize(df['Code_Unite'])
+            self.agences = pd.Index(agences)
+            self.agence_counts = np.bincount(self.agence_codes[self.agence_codes >= 0], minlength=len(agences))
+        if 'Date_Integration' in df.columns:
+            self.month = date_col(df).dt.month.fillna(0).astype(np.int8).to_numpy()
+            self.month_counts = np.bincount(self.month, minlength=13)
+        vis = df[[c for c in df.columns if c not in DERIVED_COLS]]
+        self.categories = {c: (vis[c].cat.categories.astype(str).str.lower(), vis[c].cat.codes.to_numpy())
+                           for c in vis.columns if isinstance(vis[c].dtype, pd.CategoricalDtype)}
+        other = [vis[c].astype(str).str.lower() for c in vis.columns if c not in self.categories]
+        self.text = other[0].str.cat(other[1:], sep=self.SEP) if other else None
+
+    def predicates(self, filters):
+        """[(nombre de lignes estimé, filtre)] ; un filtre reçoit des positions (ou slice(None)) et renvoie un masque"""
+        preds = []
+        if filters.get('statut') and self.ok is not None:
+            if filters['statut'] == 'OK': preds.append((self.n_ok, lambda p: self.ok[p]))
+            else: preds.append((self.n - self.n_ok, lambda p: ~self.ok[p]))
+        if filters.get('agence') is not None and hasattr(self, 'agence_codes'):
+            code = self.agences.get_indexer([filters['agence']])[0]
+            preds.append((int(self.agence_counts[code]) if code >= 0 else 0, lambda p: self.agence_codes[p] == code))
+        if filters.get('mois') and hasattr(self, 'month'):
+            m = filters['mois']
+            preds.append((int(self.month_counts[m]), lambda p: self.month[p] == m))
+        return preds
+
+    def rows(self, filters):
+        """Positions des lignes satisfaisant tous les filtres : le plus sélectif d'abord, les suivants
+        évalués seulement sur les lignes restantes"""
+        pos = None
+        for _, pred in sorted(self.predicates(filters), key=lambda p: p[0]):
+            pos = np.flatnonzero(pred(slice(None))) if pos is None else pos[pred(pos)]
+            if not len(pos): break
+        return np.arange(self.n) if pos is None else pos
+
+    def contains(self, q):
+        """Positions des lignes dont au moins une colonne contient q (insensible à la casse)"""
+        q = q.lower()
+        mask = np.zeros(self.n, dtype=bool)
+        for cats, codes in self.categories.values():
+            hit = np.flatnonzero(np.asarray(cats.str.contains(q, regex=False)))
+            if len(hit): mask |= np.isin(codes, hit)
+        if self.text is not None:
+            mask |= self.text.str.contains(q, regex=False).to_numpy()
+        return np.flatnonzero(mask)
@@ -0,0 +1,22 @@
+"""Réglages numériques lus dans l'environnement (ANALYZER_*), tous interprétés de la même façon"""
+import logging
+import os
+
+logger = logging.getLogger('analyzer.settings')
+
+def env_number(name, default, kind=float):
+    """Valeur strictement positive de la variable name (convertie par kind, '1.5' accepté pour un float) ;
+    absente, vide, invalide ou <= 0 : default"""
+    raw = os.environ.get(name, '').strip()
+    if not raw: return default
+    try:
+        value = kind(float(raw.replace(',', '.')))
+        if value > 0: return value
+    except (ValueError, OverflowError):
+        pass
+    logger.warning("%s=%r invalide, valeur par défaut %s utilisée", name, raw, default)
+    return default
+
+def env_mb(name, default_mb):
+    """Taille en octets d'un réglage exprimé en Mo (décimales acceptées)"""
+    return int(env_number(name, default_mb) * 2**20)
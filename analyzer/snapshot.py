@@ -0,0 +1,73 @@
+"""Instantanés Parquet des jeux de données nettoyés, indexés par hash du fichier source"""
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from .settings import env_mb
+
+SNAPSHOT_DIR = os.environ.get('ANALYZER_SNAPSHOT_DIR', str(Path.home() / '.cache' / 'excel_analyzer' / 'snapshots'))
+SNAPSHOT_MAX_BYTES = env_mb('ANALYZER_SNAPSHOT_MAX_MB', 2048)
+
+class SnapshotStore:
+    """Répertoire d'instantanés : <clé>.parquet + <clé>.json (métadonnées), éviction LRU au-delà de max_bytes"""
+    def __init__(self, root=SNAPSHOT_DIR, max_bytes=SNAPSHOT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key, ext):
+        return self.root / f"{key.replace(':', '_')}.{ext}"
+
+    def has(self, key):
+        return self._path(key, 'parquet').exists() and self._path(key, 'json').exists()
+
+    def save(self, key, df, **meta):
+        """Écrit l'instantané (écriture atomique) puis applique la politique d'éviction"""
+        tmp = self._path(key, 'parquet.tmp')
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, self._path(key, 'parquet'))
+        meta = {'key': key, 'rows': len(df), 'cols': len(df.columns), 'created': time.time(), **meta}
+        self._path(key, 'json').write_text(json.dumps(meta, default=str), encoding='utf-8')
+        self.evict()
+
+    def load(self, key):
+        """Relit l'instantané en mémoire mappée ; renvoie (DataFrame, métadonnées)"""
+        path = self._path(key, 'parquet')
+        df = pd.read_parquet(path, memory_map=True)
+        os.utime(path)
+        return df, self.meta(key)
+
+    def meta(self, key):
+        return json.loads(self._path(key, 'json').read_text(encoding='utf-8'))
+
+    def entries(self):
+        """Instantanés du plus récemment utilisé au plus ancien : [(métadonnées, taille, dernier accès)]"""
+        out = []
+        for p in self.root.glob('*.parquet'):
+            j = p.with_suffix('.json')
+            if not j.exists(): continue
+            try:
+                stat = p.stat()
+                out.append((json.loads(j.read_text(encoding='utf-8')), stat.st_size, stat.st_mtime))
+            except (OSError, ValueError):
+                continue
+        return sorted(out, key=lambda e: e[2], reverse=True)
+
+    def recent(self, n=10):
+        return [m for m, _, _ in self.entries()[:n]]
+
+    def size(self):
+        return sum(s for _, s, _ in self.entries())
+
+    def evict(self):
+        """Supprime les instantanés les moins récemment utilisés tant que le budget disque est dépassé"""
+        entries = self.entries()
+        total = sum(s for _, s, _ in entries)
+        while len(entries) > 1 and total > self.max_bytes:
+            meta, size, _ = entries.pop()
+            for ext in ('parquet', 'json'):
+                self._path(meta['key'], ext).unlink(missing_ok=True)
+            total -= size
@@ -1,411 +1,289 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
-import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
-from thefuzz import fuzz, process
+import uuid
+
+from analyzer import (clean_data, visible, memory_report, file_hash,
+                      parse_nl_query, fuzzy_search, calc_scores, get_suggestions, ContractIndex, QueryIndex,
+                      create_excel, EXCEL_SHEETS,
+                      read_workbook, ANALYSIS_COLS, SnapshotStore, reconcile, FUZZY_THRESHOLD, SIDES,
+                      Aggregates, concat_clean, chart_data, EXPORT_FORMATS, export_chunks, iter_frames, spool, report_bundle,
+                      Profiler, PROFILE_ENABLED, PROFILE_MEMORY, JobRunner, DONE, FAILED, DatasetRegistry)
 
 st.set_page_config(page_title="Excel Analyzer Pro", page_icon="📊", layout="wide")
 st.title("📊 Excel Analyzer Pro - Analyse intelligente de contrats")
 st.markdown("### Embellissez, analysez et recherchez dans vos fichiers Excel")
 
-# ==================== FONCTIONS ====================
-
-def clean_data(df):
-    df = df.dropna(how='all').dropna(axis=1, how='all')
-    for col in df.select_dtypes(include=['object']).columns:
-        df[col] = df[col].astype(str).str.strip()
-    return df.replace('nan', '').fillna('')
-
-def parse_nl_query(query, df):
-    filters = {}
-    q = query.lower()
-    if any(w in q for w in ['ko','échec','erreur','rejet']): filters['statut'] = 'KO'
-    elif any(w in q for w in ['ok','réussi','succès']): filters['statut'] = 'OK'
-    if 'Code_Unite' in df.columns:
-        for ag in df['Code_Unite'].unique():
-            if str(ag).lower() in q: filters['agence'] = ag; break
-    mois = {'janvier':1,'jan':1,'février':2,'fev':2,'mars':3,'avril':4,'mai':5,'juin':6,'juillet':7,'août':8,'aout':8,'septembre':9,'sept':9,'octobre':10,'novembre':11,'décembre':12,'dec':12}
-    for n,m in mois.items():
-        if n in q: filters['mois'] = m; break
-    if 'initial' in q: filters['init_avenant'] = 'Initial'
-    elif 'avenant' in q: filters['init_avenant'] = 'Avenant'
-    return filters
-
-def fuzzy_search(query, df, col, lim=10):
-    if col not in df.columns: return []
-    vals = [v for v in df[col].dropna().astype(str).unique() if v.strip()]
-    if not vals or not query.strip(): return []
-    return [(m[0],m[1]) for m in process.extract(query,vals,limit=lim,scorer=fuzz.token_sort_ratio) if m[1]>50]
-
-def calc_score(row, query, filters):
-    score = 0
-    if 'Contrat' in row.index:
-        if query.lower() in str(row['Contrat']).lower(): score += 100
-        else: score += fuzz.partial_ratio(query.lower(), str(row['Contrat']).lower()) * 0.5
-    if filters.get('agence') and row.get('Code_Unite') == filters['agence']: score += 50
-    if filters.get('statut'):
-        if filters['statut']=='KO' and str(row.get('Statut_Final','')).upper()!='OK': score += 50
-        elif filters['statut']=='OK' and str(row.get('Statut_Final','')).upper()=='OK': score += 50
-    if filters.get('mois'):
+# ==================== PROFILAGE ====================
+with st.sidebar:
+    prof_on = st.toggle("⏱️ Profilage", value=PROFILE_ENABLED, help="Durée et mémoire de chaque étape de ce rerun (cascade en bas de ce panneau, journal JSON)")
+    if prof_on:
+        # tracemalloc est global au processus : activé au démarrage seulement, pas par session
+        st.caption("Pic mémoire par étape : " + ("activé (ANALYZER_PROFILE_MEMORY)" if PROFILE_MEMORY else
+                   "désactivé — lancer l'application avec ANALYZER_PROFILE_MEMORY=1 pour le diagnostic"))
+prof = Profiler(prof_on, page='app')
+
+def waterfall(records):
+    """Cascade des étapes d'un rerun : une barre par étape, de son début à sa fin"""
+    fig = go.Figure(go.Bar(y=[r['etape'] for r in records], x=[r['duree_ms'] for r in records],
+                           base=[r['debut_ms'] for r in records], orientation='h',
+                           customdata=[[r['rss_mo'], r['rss_delta_mo'], r.get('pic_alloc_mo', '—')] for r in records],
+                           hovertemplate="%{y} : %{x:,.1f} ms<br>RSS %{customdata[0]:,.1f} Mo (%{customdata[1]:+.1f})<br>Pic alloc. %{customdata[2]} Mo<extra></extra>"))
+    fig.update_layout(height=max(200, 28*len(records)+80), margin=dict(l=0, r=0, t=10, b=0),
+                      xaxis_title="ms depuis le début du rerun", yaxis=dict(autorange='reversed'))
+    return fig
+
+# ==================== INGESTION ====================
+
+INGEST_MAX_ENTRIES = 8
+
+@st.cache_resource
+def get_registry():
+    """Registre partagé par toutes les sessions : données nettoyées, agrégats et index par hash du contenu"""
+    return DatasetRegistry()
+
+def session_id():
+    return st.session_state.setdefault('session_id', uuid.uuid4().hex)
+
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore()
+
+def _from_snapshot(key):
+    df_clean, meta = get_snapshot_store().load(key)
+    return visible(df_clean).head(10), df_clean, pd.DataFrame(meta.get('memory', []))
+
+def load_snapshot(key, name=None):
+    """Rouvre un jeu de données déjà analysé depuis son instantané Parquet"""
+    preview, df_clean, mem = get_registry().get(key, 'donnees', lambda: _from_snapshot(key), name=name)
+    return key, preview, df_clean, mem
+
+def load_dataset(uploaded, all_cols=False):
+    """Lit et nettoie le fichier une seule fois par contenu ; le DataFrame renvoyé est partagé, ne pas le modifier.
+    all_cols : charger toutes les colonnes plutôt que les seules colonnes d'analyse"""
+    data = uploaded.getvalue()
+    key = file_hash(data) + (':all' if all_cols else '')
+    def _load():
+        store = get_snapshot_store()
+        if store.has(key):
+            return _from_snapshot(key)
+        bar = st.progress(0.0, text="📖 Lecture du fichier...")
+        with prof.stage('lecture'):
+            df = read_workbook(data, None if all_cols else ANALYSIS_COLS, name=uploaded.name,
+                               progress=lambda n, total: bar.progress(min(n/total, 1.0) if total else 1.0, text=f"📖 Lecture : {n:,} / {total:,} lignes"))
+        bar.progress(1.0, text="🧹 Nettoyage...")
+        with prof.stage('nettoyage'):
+            df_clean = clean_data(df)
+        mem = memory_report(df, df_clean)
+        bar.progress(1.0, text="💽 Écriture de l'instantané...")
         try:
-            if pd.to_datetime(row.get('Date_Integration')).month == filters['mois']: score += 40
-        except: pass
-    return score
-
-def get_suggestions(inp, df, lim=5):
-    if not inp or len(inp)<2: return []
-    sugg = []
-    if 'Contrat' in df.columns:
-        for c in df['Contrat'].dropna().astype(str)[df['Contrat'].astype(str).str.contains(inp,case=False,na=False)].head(lim):
-            sugg.append({'type':'📄 Contrat','value':c,'score':fuzz.partial_ratio(inp.lower(),c.lower())})
-    if 'Code_Unite' in df.columns:
-        for ag in df['Code_Unite'].unique():
-            if inp.lower() in str(ag).lower(): sugg.append({'type':'🏢 Agence','value':ag,'score':100})
-    if 'ko' in inp.lower(): sugg.append({'type':'❌ Statut','value':'KO','score':100})
-    if 'ok' in inp.lower(): sugg.append({'type':'✅ Statut','value':'OK','score':100})
-    return sorted(sugg, key=lambda x:x['score'], reverse=True)[:lim]
-
-def style_ws(ws):
-    hf = PatternFill(start_color="366092",end_color="366092",fill_type="solid")
-    for c in ws[1]:
-        c.fill = hf
-        c.font = Font(bold=True,color="FFFFFF",size=11)
-        c.alignment = Alignment(horizontal='center',vertical='center')
-        c.border = Border(left=Side(style='thin'),right=Side(style='thin'),top=Side(style='thin'),bottom=Side(style='thin'))
-    for i,row in enumerate(ws.iter_rows(min_row=2,max_row=ws.max_row),2):
-        fill = PatternFill(start_color="F2F2F2" if i%2==0 else "FFFFFF",fill_type="solid")
-        for c in row:
-            c.fill = fill
-            c.border = Border(left=Side(style='thin'),right=Side(style='thin'),top=Side(style='thin'),bottom=Side(style='thin'))
-    for col in ws.columns:
-        ws.column_dimensions[col[0].column_letter].width = min(max(len(str(c.value or '')) for c in col)+2, 50)
-    ws.freeze_panes = 'A2'
-
-def create_excel(df):
-    """Crée Excel ULTRA-DÉTAILLÉ avec 7 onglets complets"""
-    output = io.BytesIO()
-    wb = Workbook()
-    wb.remove(wb.active)
-    
-    # ONGLET 1: Données nettoyées
-    ws1 = wb.create_sheet('Données nettoyées')
-    for r in dataframe_to_rows(df, index=False, header=True):
-        ws1.append(r)
-    style_ws(ws1)
-    
-    # ONGLET 2: Vue d'ensemble
-    total = len(df)
-    ok = len(df[df['Statut_Final'].str.upper()=='OK'])
-    ko = total - ok
-    taux = round(ok/total*100,2) if total else 0
-    init = len(df[df['Initial/Avenant'].str.contains('Initial',case=False,na=False)])
-    aven = len(df[df['Initial/Avenant'].str.contains('Avenant',case=False,na=False)])
-    
-    ws2 = wb.create_sheet('Vue d ensemble')
-    vue = [['Métrique','Valeur'],
-           ['Nombre total de contrats',total],
-           ['Nombre de contrats OK',ok],
-           ['Nombre de contrats KO',ko],
-           ['Taux de réussite (%)',f'{taux}%'],
-           ['Nombre de contrats initiaux',init],
-           ['Nombre d\'avenants',aven],
-           ['Nombre d\'agences',df['Code_Unite'].nunique() if 'Code_Unite' in df.columns else 0]]
-    for r in vue: ws2.append(r)
-    style_ws(ws2)
-    
-    # ONGLET 3: Analyse par agence ULTRA-DÉTAILLÉE
-    if 'Code_Unite' in df.columns and 'Statut_Final' in df.columns:
-        ws3 = wb.create_sheet('Analyse par agence')
-        r = 1
-        
-        # Titre
-        ws3.cell(r,1,'ANALYSE COMPLÈTE PAR AGENCE (CODE_UNITE)').font = Font(bold=True,size=14,color="366092")
-        ws3.merge_cells(f'A{r}:G{r}')
-        r += 2
-        
-        # Calculer métriques
-        ag_metrics = []
-        for ag in df['Code_Unite'].unique():
-            d = df[df['Code_Unite']==ag]
-            t = len(d)
-            o = (d['Statut_Final'].str.upper()=='OK').sum()
-            ag_metrics.append({'Agence':ag,'Total':t,'OK':o,'KO':t-o,'Taux':round(o/t*100,2) if t else 0})
-        
-        df_ag = pd.DataFrame(ag_metrics)
-        moy = df_ag['Taux'].mean()
-        
-        # Dashboard exécutif
-        ws3.cell(r,1,'🎯 DASHBOARD EXÉCUTIF').font = Font(bold=True,size=13,color="FF0000")
-        r += 1
-        
-        dash = [['Indicateur','Valeur'],
-                ['🏆 Meilleure agence',f"{df_ag.loc[df_ag['Taux'].idxmax(),'Agence']} ({df_ag['Taux'].max():.1f}%)"],
-                ['🔴 Pire agence',f"{df_ag.loc[df_ag['Taux'].idxmin(),'Agence']} ({df_ag['Taux'].min():.1f}%)"],
-                ['📊 Taux moyen national',f'{moy:.1f}%'],
-                ['⚠️ Agences en alerte (< 60%)',len(df_ag[df_ag['Taux']<60])],
-                ['✅ Agences au-dessus moyenne',f"{len(df_ag[df_ag['Taux']>=moy])}/{len(df_ag)}"],
-                ['📈 Total agences',len(df_ag)]]
-        
-        for row in dash:
-            ws3.append(row)
-            if dash.index(row) == 0:
-                for c in ws3[r]:
-                    c.fill = PatternFill(start_color="4472C4",end_color="4472C4",fill_type="solid")
-                    c.font = Font(bold=True,color="FFFFFF")
-            r += 1
-        r += 2
-        
-        # Classement général
-        ws3.cell(r,1,'1. 🏆 CLASSEMENT GÉNÉRAL DES AGENCES').font = Font(bold=True,size=12)
-        r += 1
-        
-        df_ag['Écart vs Moyenne'] = (df_ag['Taux'] - moy).round(1)
-        df_ag['Rang'] = df_ag['Taux'].rank(ascending=False,method='min').astype(int)
-        df_ag['Statut'] = df_ag['Taux'].apply(lambda x: '🟢 Excellent' if x>=80 else '🟡 Moyen' if x>=60 else '🔴 Critique')
-        df_class = df_ag.sort_values('Rang')[['Rang','Agence','Total','OK','KO','Taux','Écart vs Moyenne','Statut']]
-        
-        for row_idx, row in enumerate(dataframe_to_rows(df_class,index=False,header=True),r):
-            for col_idx, val in enumerate(row,1):
-                cell = ws3.cell(row_idx,col_idx,val)
-                if row_idx == r:
-                    cell.fill = PatternFill(start_color="70AD47",end_color="70AD47",fill_type="solid")
-                    cell.font = Font(bold=True,color="FFFFFF")
-                else:
-                    if col_idx == 8:
-                        if '🟢' in str(val): cell.fill = PatternFill(start_color="C6EFCE",fill_type="solid")
-                        elif '🔴' in str(val): cell.fill = PatternFill(start_color="FFC7CE",fill_type="solid")
-                        elif '🟡' in str(val): cell.fill = PatternFill(start_color="FFEB9C",fill_type="solid")
-        r += len(df_class) + 3
-        
-        # Agences à risque
-        risque = df_class[df_class['Taux']<60]
-        if len(risque)>0:
-            ws3.cell(r,1,'2. ⚠️ AGENCES À RISQUE (Taux < 60%)').font = Font(bold=True,size=12,color="C00000")
-            r += 1
-            risque_display = risque.copy()
-            risque_display['Action recommandée'] = 'Audit urgent + Plan d\'action'
-            for row_idx, row in enumerate(dataframe_to_rows(risque_display,index=False,header=True),r):
-                for col_idx, val in enumerate(row,1):
-                    cell = ws3.cell(row_idx,col_idx,val)
-                    if row_idx == r:
-                        cell.fill = PatternFill(start_color="C00000",fill_type="solid")
-                        cell.font = Font(bold=True,color="FFFFFF")
-                    else:
-                        cell.fill = PatternFill(start_color="FFC7CE",fill_type="solid")
-            r += len(risque) + 3
-        
-        # Top 5 performers
-        top5 = df_class.head(5)
-        ws3.cell(r,1,'3. 🌟 TOP 5 PERFORMERS').font = Font(bold=True,size=12,color="00B050")
-        r += 1
-        for row_idx, row in enumerate(dataframe_to_rows(top5,index=False,header=True),r):
-            for col_idx, val in enumerate(row,1):
-                cell = ws3.cell(row_idx,col_idx,val)
-                if row_idx == r:
-                    cell.fill = PatternFill(start_color="00B050",fill_type="solid")
-                    cell.font = Font(bold=True,color="FFFFFF")
-                else:
-                    cell.fill = PatternFill(start_color="C6EFCE",fill_type="solid")
-        r += len(top5) + 3
-        
-        # Volume par agence
-        ws3.cell(r,1,'4. 📊 VOLUME TOTAL PAR AGENCE').font = Font(bold=True,size=12)
-        r += 1
-        vol = df['Code_Unite'].value_counts().reset_index()
-        vol.columns = ['Agence','Nombre total']
-        vol['% du total'] = round(vol['Nombre total']/total*100,2)
-        for row in dataframe_to_rows(vol,index=False,header=True):
-            ws3.append(row)
-            r += 1
-        r += 2
-        
-        # Croisement Agences × Types d'erreurs
-        df_ko = df[df['Statut_Final'].str.upper()!='OK']
-        if len(df_ko)>0:
-            ws3.cell(r,1,'5. 🔀 CROISEMENT AGENCES × TYPES D\'ERREURS').font = Font(bold=True,size=12)
-            r += 1
-            try:
-                cross = pd.crosstab(df_ko['Code_Unite'],df_ko['Statut_Final'],margins=True).reset_index()
-                for row in dataframe_to_rows(cross,index=False,header=True):
-                    ws3.append(row)
-                    r += 1
-            except: pass
-    
-    # ONGLET 4: Contrats OK détaillé
-    if ok > 0:
-        ws4 = wb.create_sheet('Contrats OK')
-        df_ok = df[df['Statut_Final'].str.upper()=='OK']
-        
-        # Résumé
-        ws4.append(['ANALYSE DES CONTRATS OK'])
-        ws4.append([])
-        ws4.append(['Métrique','Valeur'])
-        ws4.append(['Total contrats OK',ok])
-        ws4.append(['% du total',f'{round(ok/total*100,1)}%'])
-        ws4.append(['Nombre de types différents',df_ok['Type (libellé)'].nunique()])
-        ws4.append(['Nombre d\'agences',df_ok['Code_Unite'].nunique()])
-        ws4.append([])
-        
-        # Par type
-        ws4.append(['RÉPARTITION PAR TYPE DE CONTRAT'])
-        ok_type = df_ok['Type (libellé)'].value_counts().reset_index()
-        ok_type.columns = ['Type','Nombre']
-        ok_type['%'] = round(ok_type['Nombre']/ok*100,1)
-        for r in dataframe_to_rows(ok_type,index=False,header=True):
-            ws4.append(r)
-        ws4.append([])
-        
-        # Par agence
-        ws4.append(['RÉPARTITION PAR AGENCE'])
-        ok_ag = df_ok['Code_Unite'].value_counts().reset_index()
-        ok_ag.columns = ['Agence','Nombre']
-        ok_ag['%'] = round(ok_ag['Nombre']/ok*100,1)
-        for r in dataframe_to_rows(ok_ag,index=False,header=True):
-            ws4.append(r)
-        
-        style_ws(ws4)
-    
-    # ONGLET 5: Contrats KO détaillé
-    if ko > 0:
-        ws5 = wb.create_sheet('Contrats KO')
-        df_ko = df[df['Statut_Final'].str.upper()!='OK']
-        
-        # Résumé
-        ws5.append(['ANALYSE DES CONTRATS KO'])
-        ws5.append([])
-        ws5.append(['Métrique','Valeur'])
-        ws5.append(['Total contrats KO',ko])
-        ws5.append(['% du total',f'{round(ko/total*100,1)}%'])
-        ws5.append(['Taux d\'échec',f'{round(ko/total*100,1)}%'])
-        ws5.append(['Nombre de types d\'erreurs',df_ko['Statut_Final'].nunique()])
-        ws5.append(['Nombre d\'agences concernées',df_ko['Code_Unite'].nunique()])
-        ws5.append([])
-        
-        # Types d'erreurs
-        ws5.append(['RÉPARTITION DES ERREURS PAR STATUT'])
-        ko_stat = df_ko['Statut_Final'].value_counts().reset_index()
-        ko_stat.columns = ['Type d\'erreur','Nombre']
-        ko_stat['%'] = round(ko_stat['Nombre']/ko*100,1)
-        for r in dataframe_to_rows(ko_stat,index=False,header=True):
-            ws5.append(r)
-        ws5.append([])
-        
-        # Par agence
-        ws5.append(['REJETS PAR AGENCE'])
-        ko_ag = df_ko['Code_Unite'].value_counts().reset_index()
-        ko_ag.columns = ['Agence','Nombre de rejets']
-        ko_ag['% des rejets'] = round(ko_ag['Nombre de rejets']/ko*100,1)
-        for r in dataframe_to_rows(ko_ag,index=False,header=True):
-            ws5.append(r)
-        ws5.append([])
-        
-        # Messages d'erreur
-        if 'Message_Integration' in df_ko.columns:
-            msg_int = df_ko[df_ko['Message_Integration']!='']['Message_Integration'].value_counts().head(15)
-            if len(msg_int)>0:
-                ws5.append(['TOP 15 MESSAGES D\'ERREUR - INTÉGRATION'])
-                for r in dataframe_to_rows(pd.DataFrame({'Message':msg_int.index,'Occurrences':msg_int.values}),index=False,header=True):
-                    ws5.append(r)
-                ws5.append([])
-        
-        # Par type de contrat
-        ws5.append(['CONTRATS KO PAR TYPE'])
-        ko_type = df_ko['Type (libellé)'].value_counts().reset_index()
-        ko_type.columns = ['Type','Nombre KO']
-        for r in dataframe_to_rows(ko_type,index=False,header=True):
-            ws5.append(r)
-        
-        style_ws(ws5)
-    
-    # ONGLET 6: Types et Avenants
-    ws6 = wb.create_sheet('Types et Avenants')
-    ws6.append(['ANALYSE DES TYPES DE CONTRATS ET AVENANTS'])
-    ws6.append([])
-    
-    # Initial vs Avenant
-    ws6.append(['RÉPARTITION INITIAL VS AVENANT'])
-    ia = df['Initial/Avenant'].value_counts().reset_index()
-    ia.columns = ['Catégorie','Nombre']
-    ia['%'] = round(ia['Nombre']/total*100,1)
-    for r in dataframe_to_rows(ia,index=False,header=True):
-        ws6.append(r)
-    ws6.append([])
-    
-    # Types détaillés
-    ws6.append(['DÉTAIL PAR TYPE DE CONTRAT'])
-    types = df['Type (libellé)'].value_counts().reset_index()
-    types.columns = ['Type','Nombre']
-    types['%'] = round(types['Nombre']/total*100,1)
-    for r in dataframe_to_rows(types,index=False,header=True):
-        ws6.append(r)
-    ws6.append([])
-    
-    # Croisement Type × Statut
-    ws6.append(['CROISEMENT TYPE × STATUT'])
-    try:
-        cross_ts = pd.crosstab(df['Type (libellé)'],df['Statut_Final'],margins=True).reset_index()
-        for r in dataframe_to_rows(cross_ts,index=False,header=True):
-            ws6.append(r)
-    except: pass
-    
-    style_ws(ws6)
-    
-    # ONGLET 7: Analyse temporelle
-    if 'Date_Integration' in df.columns:
-        ws7 = wb.create_sheet('Analyse temporelle')
-        df_temp = df.copy()
-        df_temp['Date_Integration'] = pd.to_datetime(df_temp['Date_Integration'],errors='coerce')
-        df_temp = df_temp.dropna(subset=['Date_Integration'])
-        
-        if len(df_temp)>0:
-            ws7.append(['ANALYSE TEMPORELLE'])
-            ws7.append([])
-            ws7.append(['Métrique','Valeur'])
-            ws7.append(['Date la plus ancienne',df_temp['Date_Integration'].min().strftime('%d/%m/%Y')])
-            ws7.append(['Date la plus récente',df_temp['Date_Integration'].max().strftime('%d/%m/%Y')])
-            ws7.append(['Nombre de jours couverts',(df_temp['Date_Integration'].max()-df_temp['Date_Integration'].min()).days])
-            ws7.append([])
-            
-            # Par jour
-            ws7.append(['VOLUME PAR JOUR'])
-            df_temp['Date'] = df_temp['Date_Integration'].dt.date
-            daily = df_temp.groupby('Date').size().reset_index(name='Nombre')
-            for r in dataframe_to_rows(daily,index=False,header=True):
-                ws7.append(r)
-            ws7.append([])
-            
-            # Par mois
-            ws7.append(['VOLUME PAR MOIS'])
-            df_temp['Mois'] = df_temp['Date_Integration'].dt.to_period('M').astype(str)
-            monthly = df_temp.groupby('Mois').size().reset_index(name='Nombre')
-            for r in dataframe_to_rows(monthly,index=False,header=True):
-                ws7.append(r)
-            
-            style_ws(ws7)
-    
-    wb.save(output)
-    output.seek(0)
-    return output
+            with prof.stage('instantane'):
+                store.save(key, df_clean, name=uploaded.name, memory=mem.to_dict('records'))
+        except Exception as e:
+            st.warning(f"⚠️ Instantané non enregistré : {e}")
+        bar.empty()
+        return df.head(10), df_clean, mem
+    preview, df_clean, mem = get_registry().get(key, 'donnees', _load, name=uploaded.name)
+    return key, preview, df_clean, mem
+
+def get_aggregates(ds_key, df):
+    """Agrégats additifs du jeu de données (calculés une fois, puis mis à jour par les deltas)"""
+    return get_registry().get(ds_key, 'agregats', lambda: Aggregates.from_frame(df))
+
+def apply_delta(ds_key, df_clean, mem, uploaded, all_cols=False):
+    """Fusionne un delta (lignes absentes sur Contrat + Date_Integration) dans le jeu courant.
+    Les agrégats du résultat sont ceux du jeu courant augmentés du delta, sans rescanner l'existant"""
+    delta_key, _, delta, _ = load_dataset(uploaded, all_cols)
+    key = file_hash(f"{ds_key}+{delta_key}".encode())
+    def _merge():
+        agg = get_aggregates(ds_key, df_clean)
+        new = agg.new_rows(delta)
+        get_registry().get(key, 'agregats', lambda: agg.plus(new))
+        merged = concat_clean(df_clean, new)
+        try:
+            get_snapshot_store().save(key, merged, name=f"+ {uploaded.name}", memory=mem.to_dict('records'))
+        except Exception as e:
+            st.warning(f"⚠️ Instantané non enregistré : {e}")
+        return visible(merged).head(10), merged, mem
+    _, merged, mem = get_registry().get(key, 'donnees', _merge, name=f"+ {uploaded.name}")
+    return key, merged, mem, len(merged) - len(df_clean)
+
+# ==================== CACHE PAR DATASET ====================
+
+def get_search_index(ds_key, df):
+    return get_registry().get(ds_key, 'index_contrats', lambda: ContractIndex(df))
+
+def get_query_index(ds_key, df):
+    return get_registry().get(ds_key, 'index_requetes', lambda: QueryIndex(df))
+
+@st.cache_data(max_entries=4*INGEST_MAX_ENTRIES)
+def get_agency_metrics(ds_key, _df, decimals=2):
+    return get_aggregates(ds_key, _df).agency_metrics(decimals)
+
+@st.cache_data(max_entries=16*INGEST_MAX_ENTRIES)
+def get_chart(ds_key, _agg, name, params=()):
+    """Données d'un graphique mémorisées par (dataset, graphique, paramètres et filtres)"""
+    return chart_data(_agg, name, **dict(params))
+
+@st.cache_resource(max_entries=4)
+def get_reconciliation(ds_key, _df, other_keys, _others, fuzzy, threshold):
+    """Rapprochement mémorisé par (référence, fichiers rapprochés, paramètres)"""
+    right = pd.concat([d.assign(Source=i+1) for i,d in enumerate(_others)], ignore_index=True) if len(_others) > 1 else _others[0]
+    return reconcile(_df, right, fuzzy=fuzzy, threshold=threshold)
+
+def excel_report_job(job, df, df_ag, sheets, data_fmt=None):
+    """Rapport Excel (tâche de fond) ; data_fmt : archive ZIP rapport + fichier de données,
+    l'onglet 1 n'étant qu'un lien vers ce fichier"""
+    progress = job.progress_fn("Écriture du rapport")
+    if data_fmt:
+        return report_bundle(df, df_ag, sheets, data_fmt, name="analyse_complete", progress=progress).read()
+    return create_excel(df, df_ag, sheets=sheets, progress=progress).getvalue()
+
+def hybrid_search_job(job, df, pos, q, filt):
+    """Scores hybrides des lignes candidates (tâche de fond) : (positions, scores) des lignes pertinentes, triées"""
+    score = calc_scores(df.iloc[pos], q, filt, progress=job.progress_fn("Calcul des scores")).to_numpy()
+    keep = np.flatnonzero(score > 0)
+    keep = keep[np.argsort(-score[keep], kind='stable')]
+    return pos[keep], score[keep]
+
+@st.cache_data(max_entries=16)
+def get_error_causes(ds_key, _agg):
+    """Causes d'erreur regroupées, calculées sur les comptages de messages des agrégats"""
+    return _agg.error_causes()
+
+# ==================== TÂCHES DE FOND ====================
+
+JOB_POLL_S = 0.5
+# Attente avant de passer au suivi de progression : les tâches courtes s'affichent directement
+JOB_INLINE_S = 0.3
+
+@st.cache_resource
+def get_job_runner():
+    return JobRunner()
+
+def start_job(slot, key, fn, *args):
+    """Tâche de fond de la session pour l'emplacement slot (rapport, recherche...).
+    Une tâche identique lancée par une autre session est rejointe ; la précédente de l'emplacement est abandonnée"""
+    runner = get_job_runner()
+    jobs = st.session_state.setdefault('jobs', {})
+    job = runner.get(key) if jobs.get(slot) == key else None
+    if job is None:
+        stop_job(slot)
+        job = runner.submit(key, fn, *args)
+        jobs[slot] = key
+    st.session_state[f"job_{slot}"] = job.state()
+    return job
+
+def stop_job(slot):
+    """La session n'attend plus la tâche de slot (annulée si aucune autre session ne l'attend)"""
+    key = st.session_state.get('jobs', {}).pop(slot, None)
+    if key is not None:
+        get_job_runner().release(key)
+        st.session_state.pop(f"job_{slot}", None)
+
+@st.fragment(run_every=JOB_POLL_S)
+def job_progress(slot, label, reset=None):
+    """Progression de la tâche de slot, rafraîchie sans relancer la page ; la page est relancée à la fin.
+    reset : clé de session de la demande, effacée en cas d'annulation"""
+    key = st.session_state.get('jobs', {}).get(slot)
+    job = get_job_runner().get(key) if key is not None else None
+    if job is None or job.done:
+        st.rerun()
+    st.session_state[f"job_{slot}"] = job.state()
+    c1,c2 = st.columns([5,1])
+    c1.progress(job.progress, text=f"⏳ {label} : {job.message or job.status} ({job.progress:.0%}, {job.elapsed():.0f} s)")
+    if c2.button("✖️ Annuler", key=f"{slot}_annuler"):
+        stop_job(slot)
+        if reset: st.session_state[reset] = None
+        st.rerun()
+
+# ==================== VUES PAGINÉES ====================
+
+PAGE_SIZES = [50, 100, 500, 1000]
+
+def view_frame(df, pos=None, score=None):
+    """Lignes d'une vue (positions dans df, None = toutes), avec la colonne _score éventuelle"""
+    out = visible(df) if pos is None else visible(df.iloc[pos])
+    return out if score is None else out.assign(_score=score)
+
+@st.cache_resource(max_entries=16)
+def get_sort_order(view_key, _df, _pos, _score, col, asc):
+    """Ordre de tri de la vue (positions dans la vue), mémorisé par (vue, colonne, sens)"""
+    s = pd.Series(_score) if col == '_score' else (_df[col] if _pos is None else _df[col].iloc[_pos])
+    return s.reset_index(drop=True).sort_values(ascending=asc, kind='stable').index.to_numpy()
+
+@st.cache_data(max_entries=64)
+def get_page(view_key, _df, _pos, _score, col, asc, page, size):
+    """Une page de la vue : seule cette tranche est sérialisée vers le navigateur"""
+    n = len(_df) if _pos is None else len(_pos)
+    idx = get_sort_order(view_key, _df, _pos, _score, col, asc)[page*size:(page+1)*size] if col else np.arange(page*size, min((page+1)*size, n))
+    return view_frame(_df, idx if _pos is None else _pos[idx], None if _score is None else _score[idx])
+
+def paged_table(df, view_key, key, pos=None, score=None, height=400):
+    """Tableau paginé et trié côté serveur ; view_key identifie la vue (dataset + requête) pour les caches"""
+    n = len(df) if pos is None else len(pos)
+    cols = list(visible(df).columns) + (['_score'] if score is not None else [])
+    c1,c2,c3,c4 = st.columns([3,1,1,1])
+    col = c1.selectbox("Trier par", [None, *cols], format_func=lambda c: "— ordre actuel —" if c is None else c, key=f"{key}_tri")
+    asc = c2.toggle("Croissant", True, key=f"{key}_asc")
+    size = c3.selectbox("Lignes / page", PAGE_SIZES, key=f"{key}_taille")
+    n_pages = max(1, -(-n // size))
+    page = min(c4.number_input(f"Page (/{n_pages:,})", 1, n_pages, 1, key=f"{key}_page"), n_pages) - 1
+    st.dataframe(get_page(view_key, df, pos, score, col, asc, page, size), width='stretch', height=height)
+    st.caption(f"Lignes {page*size+1:,}–{min((page+1)*size, n):,} sur {n:,}")
+
+def export_buttons(df, name, key, pos=None, extra=None):
+    """Téléchargement au format choisi, généré par paquets seulement au clic (rien n'est calculé à chaque rerun)"""
+    c1, c2 = st.columns([1,3])
+    fmt = c1.selectbox("Format", list(EXPORT_FORMATS), key=f"{key}_fmt", label_visibility="collapsed")
+    ext, mime, _ = EXPORT_FORMATS[fmt]
+    c2.download_button(f"📥 Télécharger ({fmt})", lambda: spool(export_chunks(fmt, iter_frames(df, pos, extra))).read(),
+                       f"{name}_{datetime.now():%Y%m%d_%H%M%S}.{ext}", mime, key=f"{key}_dl")
 
 # ==================== INTERFACE ====================
 
 uploaded = st.file_uploader("📁 Fichier Excel", type=['xlsx','xls'])
+all_cols = st.toggle("Charger toutes les colonnes", value=False,
+                     help=f"Par défaut seules les colonnes utilisées par les analyses sont lues ({', '.join(ANALYSIS_COLS)})")
+
+snap_key = None
+if not uploaded:
+    recent = {m['key']: m for m in get_snapshot_store().recent()}
+    if recent:
+        snap_key = st.selectbox("🕘 Ou rouvrir un jeu de données récent", [None, *recent],
+                                format_func=lambda k: "—" if k is None else f"{recent[k].get('name','?')} ({recent[k]['rows']:,} lignes, {datetime.fromtimestamp(recent[k]['created']):%d/%m/%Y %H:%M})")
 
-if uploaded:
+if uploaded or snap_key:
     try:
-        df = pd.read_excel(uploaded)
+        with prof.stage('chargement'):
+            ds_key, preview, df_clean, mem = load_dataset(uploaded, all_cols) if uploaded else load_snapshot(snap_key, recent[snap_key].get('name'))
+        deltas = st.file_uploader("➕ Ajouter des deltas (fichiers du jour)", type=['xlsx','xls'], accept_multiple_files=True, key="delta_files",
+                                  help="Les lignes déjà présentes (même Contrat et Date_Integration) sont ignorées ; les agrégats sont mis à jour sans tout recalculer")
+        for d in deltas or []:
+            with prof.stage(f'delta {d.name}'):
+                ds_key, df_clean, mem, n_new = apply_delta(ds_key, df_clean, mem, d, all_cols)
+            st.info(f"➕ {d.name} : {n_new:,} nouvelle(s) ligne(s)")
+        # Le jeu courant reste résident tant que la session l'utilise
+        get_registry().attach(session_id(), [ds_key])
+        prof.context.update(ds=ds_key, lignes=len(df_clean))
+        with prof.stage('agregats'):
+            agg = get_aggregates(ds_key, df_clean)
+        with prof.stage('index_contrats'):
+            index = get_search_index(ds_key, df_clean)
         with st.expander("👁️ Aperçu", expanded=False):
-            st.dataframe(df.head(10), width='stretch')
+            st.dataframe(preview, width='stretch')
         
-        df_clean = clean_data(df)
-        st.success(f"✅ {len(df_clean)} lignes, {len(df_clean.columns)} colonnes")
+        st.success(f"✅ {len(df_clean)} lignes, {len(visible(df_clean).columns)} colonnes")
+        reg = get_registry()
+        store = get_snapshot_store()
+        st.caption(f"⚡ Registre partagé : {reg.hits} hit(s), {reg.misses} miss(es), {reg.size()/2**20:.1f} / {reg.max_bytes/2**20:.0f} Mo en mémoire"
+                   f" ({reg.refs().get(ds_key, 0)} session(s) sur ce fichier)"
+                   f" · 💽 Instantanés : {store.size()/2**20:.1f} / {store.max_bytes/2**20:.0f} Mo")
         
-        tab1,tab2,tab3,tab4,tab5,tab6 = st.tabs(["🔍 Recherche","📋 Données","🏢 Dashboard","📊 Analyses","📈 Visualisations","💾 Export"])
+        tab1,tab2,tab3,tab4,tab5,tab6,tab7 = st.tabs(["🔍 Recherche","📋 Données","🏢 Dashboard","📊 Analyses","📈 Visualisations","💾 Export","🔗 Rapprochement"])
         
         # TAB 1: RECHERCHE
         with tab1:
@@ -421,7 +299,8 @@ if uploaded:
                 mode = st.selectbox("Mode", ["🧠 Hybride","🎯 Exact","🔤 Flou"])
             
             if q and len(q)>=2:
-                sugg = get_suggestions(q, df_clean)
+                with prof.stage('suggestions'):
+                    sugg = get_suggestions(q, df_clean, index=index)
                 if sugg:
                     with st.expander("💡 Suggestions", expanded=True):
                         cols = st.columns(min(len(sugg),5))
@@ -429,76 +308,88 @@ if uploaded:
                             cols[i].button(f"{s['type']}: {s['value']}", key=f"sg{i}")
             
             if st.button("🔍 RECHERCHER", type="primary") and q:
-                res = df_clean.copy()
+                with prof.stage(f"recherche {mode.split()[-1].lower()}"):
+                    qindex = get_query_index(ds_key, df_clean)
+                    filt, pos, score = {}, None, None
                 
-                if mode == "🧠 Hybride":
-                    filt = parse_nl_query(q, df_clean)
-                    if filt:
-                        st.info(f"Filtres: {', '.join([f'{k}:{v}' for k,v in filt.items()])}")
-                    
-                    if filt.get('statut'):
-                        res = res[res['Statut_Final'].str.upper()==filt['statut']] if filt['statut']=='OK' else res[res['Statut_Final'].str.upper()!='OK']
-                    if filt.get('agence'):
-                        res = res[res['Code_Unite']==filt['agence']]
-                    if filt.get('mois'):
-                        res['Date_Integration'] = pd.to_datetime(res['Date_Integration'],errors='coerce')
-                        res = res[res['Date_Integration'].dt.month==filt['mois']]
-                    
-                    res['_score'] = res.apply(lambda r: calc_score(r,q,filt), axis=1)
-                    res = res[res['_score']>0].sort_values('_score',ascending=False)
+                    job_key = None
+                    if mode == "🧠 Hybride":
+                        # Scores calculés en tâche de fond ; résultats repris ci-dessous une fois la tâche terminée
+                        filt = parse_nl_query(q, df_clean)
+                        job_key = ('hybride', ds_key, q)
+                        start_job('recherche', job_key, hybrid_search_job, df_clean, qindex.rows(filt), q, filt).wait(JOB_INLINE_S)
+                    else:
+                        stop_job('recherche')
                 
-                elif mode == "🎯 Exact":
-                    mask = pd.Series([False]*len(res))
-                    for col in res.columns:
-                        mask |= res[col].astype(str).str.contains(q,case=False,na=False)
-                    res = res[mask]
+                    if mode == "🎯 Exact":
+                        pos = qindex.contains(q)
                 
-                else:
-                    if 'Contrat' in res.columns:
-                        mtch = fuzzy_search(q,res,'Contrat',50)
+                    elif mode == "🔤 Flou" and 'Contrat' in df_clean.columns:
+                        mtch = fuzzy_search(q,df_clean,'Contrat',50,index=index)
                         if mtch:
-                            res = res[res['Contrat'].isin([m[0] for m in mtch])]
-                            res['_score'] = res['Contrat'].map({m[0]:m[1] for m in mtch})
-                            res = res.sort_values('_score',ascending=False)
+                            pos = np.flatnonzero(df_clean['Contrat'].isin([m[0] for m in mtch]).to_numpy())
+                            score = df_clean['Contrat'].iloc[pos].map({m[0]:m[1] for m in mtch}).astype(float).to_numpy()
+                            order = np.argsort(-score, kind='stable')
+                            pos, score = pos[order], score[order]
                 
-                if len(res)>0:
-                    st.success(f"✅ {len(res)} résultat(s)")
-                    if '_score' in res.columns:
+                    # Résultats gardés en session (positions et scores) pour la pagination
+                    st.session_state.search = {'ds': ds_key, 'q': q, 'mode': mode, 'filt': filt, 'pos': pos, 'score': score, 'job': job_key}
+            
+            sr = st.session_state.get('search')
+            if sr and sr['ds'] != ds_key:
+                # Nouveau fichier : la recherche précédente (éventuellement en cours) n'est plus attendue
+                stop_job('recherche')
+                st.session_state.search = sr = None
+            if sr and sr['ds'] == ds_key and sr['job']:
+                job = get_job_runner().get(sr['job'])
+                if job is not None and job.status == DONE:
+                    sr['pos'], sr['score'] = job.result
+                    sr['job'] = None
+                elif job is not None and not job.done:
+                    job_progress('recherche', f"Recherche « {sr['q']} »", reset='search')
+                else:
+                    st.warning(f"Recherche interrompue : {job.error if job is not None and job.status == FAILED else 'annulée'}")
+                    st.session_state.search = sr = None
+            if sr and sr['ds'] == ds_key and not sr['job']:
+                if sr['filt']:
+                    st.info(f"Filtres: {', '.join([f'{k}:{v}' for k,v in sr['filt'].items()])}")
+                n_res = len(df_clean) if sr['pos'] is None else len(sr['pos'])
+                if n_res>0:
+                    st.success(f"✅ {n_res} résultat(s)")
+                    if sr['score'] is not None:
                         c1,c2,c3 = st.columns(3)
-                        c1.metric("Moy", f"{res['_score'].mean():.0f}%")
-                        c2.metric("Max", f"{res['_score'].max():.0f}%")
-                        c3.metric("Min", f"{res['_score'].min():.0f}%")
-                    st.dataframe(res, width='stretch', height=400)
-                    st.download_button("📥 CSV", res.to_csv(index=False).encode(), f"recherche_{datetime.now():%Y%m%d_%H%M%S}.csv")
+                        c1.metric("Moy", f"{sr['score'].mean():.0f}%")
+                        c2.metric("Max", f"{sr['score'].max():.0f}%")
+                        c3.metric("Min", f"{sr['score'].min():.0f}%")
+                    paged_table(df_clean, f"{ds_key}|{sr['mode']}|{sr['q']}", "rech", sr['pos'], sr['score'])
+                    export_buttons(df_clean, "recherche", "rech_export", sr['pos'], None if sr['score'] is None else {'_score': sr['score']})
                 else:
-                    st.warning(f"Aucun résultat pour '{q}'")
+                    st.warning(f"Aucun résultat pour '{sr['q']}'")
         
         # TAB 2: DONNÉES
-        with tab2:
+        with tab2, prof.stage('donnees'):
             st.subheader("📋 Données nettoyées")
-            st.dataframe(df_clean, width='stretch', height=400)
+            paged_table(df_clean, ds_key, "donnees")
+            export_buttons(df_clean, "donnees", "donnees_export")
             c1,c2,c3,c4 = st.columns(4)
             c1.metric("Lignes", len(df_clean))
-            c2.metric("Colonnes", len(df_clean.columns))
-            c3.metric("Doublons", df_clean.duplicated().sum())
+            c2.metric("Colonnes", len(visible(df_clean).columns))
+            c3.metric("Doublons", visible(df_clean).duplicated().sum())
             if 'Statut_Final' in df_clean.columns:
-                c4.metric("OK", len(df_clean[df_clean['Statut_Final'].str.upper()=='OK']))
+                c4.metric("OK", agg.ok)
+            
+            with st.expander("💾 Empreinte mémoire (avant / après typage)", expanded=False):
+                tot = mem.iloc[-1]
+                st.metric("Mémoire", f"{tot['Après (Mo)']:.1f} Mo", f"{tot['Après (Mo)']-tot['Avant (Mo)']:+.1f} Mo vs lecture brute", delta_color="inverse")
+                st.dataframe(mem, width='stretch', hide_index=True)
         
         # TAB 3: DASHBOARD AGENCES
-        with tab3:
+        with tab3, prof.stage('dashboard'):
             st.subheader("🏢 Dashboard Agences - Vue Exécutive")
             
             if 'Code_Unite' in df_clean.columns and 'Statut_Final' in df_clean.columns:
-                agm = []
-                for ag in df_clean['Code_Unite'].unique():
-                    d = df_clean[df_clean['Code_Unite']==ag]
-                    t = len(d)
-                    o = (d['Statut_Final'].str.upper()=='OK').sum()
-                    agm.append({'Agence':ag,'Total':t,'OK':o,'KO':t-o,'Taux':round(o/t*100,1) if t else 0})
-                
-                df_ag = pd.DataFrame(agm)
+                df_ag = get_agency_metrics(ds_key, df_clean, 1)
                 moy = df_ag['Taux'].mean()
-                df_ag['Écart'] = (df_ag['Taux'] - moy).round(1)
                 df_ag = df_ag.sort_values('Taux', ascending=False)
                 
                 # Métriques clés
@@ -520,8 +411,7 @@ if uploaded:
                 with c3:
                     tri = st.selectbox("Trier par", ["Taux","KO","Total","Agence"])
                 
-                df_f = df_ag[df_ag['Agence'].isin(filt_ag)] if filt_ag else df_ag
-                df_f = df_f[df_f['Taux'] >= seuil].sort_values(tri, ascending=False)
+                df_f = get_chart(ds_key, agg, 'agences', (('agences', tuple(filt_ag)), ('seuil', seuil), ('tri', tri)))
                 
                 # Graphiques
                 st.markdown("### 📊 Visualisations")
@@ -545,8 +435,7 @@ if uploaded:
                 
                 # Tableau détaillé
                 st.markdown("### 📋 Tableau Détaillé")
-                df_f['Statut'] = df_f['Taux'].apply(lambda x: '🟢 Excellent' if x>=80 else '🟡 Moyen' if x>=60 else '🔴 Critique')
-                df_f['Écart vs Moy'] = df_f['Écart'].apply(lambda x: f"{x:+.1f}%")
+                df_f['Écart vs Moy'] = df_f['Écart vs Moyenne'].apply(lambda x: f"{x:+.1f}%")
                 st.dataframe(df_f[['Agence','Total','OK','KO','Taux','Écart vs Moy','Statut']], 
                            width='stretch', height=350, hide_index=True)
                 
@@ -590,22 +479,9 @@ if uploaded:
                     ag_select = st.selectbox("Sélectionner une agence", df_ag['Agence'].tolist())
                     
                     if ag_select:
-                        df_temp = df_clean[df_clean['Code_Unite']==ag_select].copy()
-                        df_temp['Date_Integration'] = pd.to_datetime(df_temp['Date_Integration'], errors='coerce')
-                        df_temp = df_temp.dropna(subset=['Date_Integration'])
+                        df_mon = agg.cube.monthly(ag_select)
                         
-                        if len(df_temp)>0:
-                            df_temp['Mois'] = df_temp['Date_Integration'].dt.to_period('M').astype(str)
-                            
-                            monthly = []
-                            for mois in df_temp['Mois'].unique():
-                                dm = df_temp[df_temp['Mois']==mois]
-                                t = len(dm)
-                                o = (dm['Statut_Final'].str.upper()=='OK').sum()
-                                monthly.append({'Mois':mois,'Total':t,'Taux':round(o/t*100,1) if t else 0})
-                            
-                            df_mon = pd.DataFrame(monthly).sort_values('Mois')
-                            
+                        if len(df_mon)>0:
                             fig = go.Figure()
                             fig.add_trace(go.Scatter(x=df_mon['Mois'], y=df_mon['Taux'],
                                                     mode='lines+markers', name='Taux',
@@ -618,8 +494,8 @@ if uploaded:
                                             height=400)
                             st.plotly_chart(fig, use_container_width=True)
                             
-                            if len(df_mon)>=2:
-                                tend = df_mon.iloc[-1]['Taux'] - df_mon.iloc[-2]['Taux']
+                            tend = agg.cube.trend(ag_select)
+                            if tend is not None:
                                 if tend > 0:
                                     st.success(f"📈 Tendance positive : +{tend:.1f}% vs mois précédent")
                                 elif tend < 0:
@@ -629,22 +505,18 @@ if uploaded:
                 
                 # Export dashboard
                 st.markdown("### 💾 Export Dashboard")
-                csv = df_f.to_csv(index=False).encode()
-                st.download_button("📥 Télécharger tableau (CSV)", csv, 
-                                  f"dashboard_agences_{datetime.now():%Y%m%d_%H%M%S}.csv")
+                export_buttons(df_f, "dashboard_agences", "dash_export")
             else:
                 st.warning("⚠️ Colonnes 'Code_Unite' ou 'Statut_Final' manquantes")
         
         # TAB 4: ANALYSES DÉTAILLÉES
-        with tab4:
+        with tab4, prof.stage('analyses'):
             st.subheader("📊 Analyses Détaillées")
             
             # Analyse statuts
             if 'Statut_Final' in df_clean.columns:
                 st.markdown("### 🎯 Analyse des Statuts")
-                total = len(df_clean)
-                ok_cnt = len(df_clean[df_clean['Statut_Final'].str.upper()=='OK'])
-                ko_cnt = total - ok_cnt
+                total, ok_cnt, ko_cnt = agg.rows, agg.ok, agg.ko
                 
                 c1,c2,c3 = st.columns(3)
                 c1.metric("Total contrats", total)
@@ -653,16 +525,32 @@ if uploaded:
                 
                 if ko_cnt > 0:
                     st.markdown("#### 🔴 Détail des Erreurs")
-                    df_ko = df_clean[df_clean['Statut_Final'].str.upper()!='OK']
-                    err_types = df_ko['Statut_Final'].value_counts().reset_index()
+                    err_types = agg.ko_values.sort_values(ascending=False, kind='stable').reset_index()
                     err_types.columns = ['Type d\'erreur','Nombre']
                     err_types['%'] = round(err_types['Nombre']/ko_cnt*100,1)
                     st.dataframe(err_types, width='stretch', hide_index=True)
+                    
+                    top_err = agg.top_errors()
+                    if len(top_err):
+                        st.markdown("#### 💬 Messages d'Erreur les Plus Fréquents")
+                        top_err = top_err.reset_index()
+                        top_err.columns = ['Message','Nombre']
+                        st.dataframe(top_err, width='stretch', hide_index=True)
+                    
+                    causes = get_error_causes(ds_key, agg)
+                    if len(causes.summary):
+                        st.markdown("#### 🧩 Causes d'Erreur (messages regroupés)")
+                        st.caption("Numéros, dates, identifiants et noms masqués ; messages quasi identiques regroupés")
+                        st.dataframe(causes.top(), width='stretch', hide_index=True)
+                        if causes.groups is not None:
+                            par_ag = causes.by_group()
+                            ag_c = st.selectbox("Causes pour l'agence", sorted(par_ag['Agence'].unique()), key="causes_agence")
+                            st.dataframe(par_ag[par_ag['Agence']==ag_c].drop(columns='Agence'), width='stretch', hide_index=True)
             
             # Analyse Initial/Avenant
             if 'Initial/Avenant' in df_clean.columns:
                 st.markdown("### 📄 Analyse Initial vs Avenants")
-                ia = df_clean['Initial/Avenant'].value_counts()
+                ia = agg.counts('Initial/Avenant')
                 c1,c2 = st.columns(2)
                 c1.metric("Contrats Initiaux", ia.get('Initial',0))
                 c2.metric("Avenants", ia.get('Avenant',0))
@@ -670,24 +558,25 @@ if uploaded:
             # Analyse types
             if 'Type (libellé)' in df_clean.columns:
                 st.markdown("### 📋 Répartition par Type de Contrat")
-                types = df_clean['Type (libellé)'].value_counts().reset_index()
+                types = agg.counts('Type (libellé)').reset_index()
                 types.columns = ['Type','Nombre']
-                types['%'] = round(types['Nombre']/len(df_clean)*100,1)
+                types['%'] = round(types['Nombre']/agg.rows*100,1)
                 st.dataframe(types, width='stretch', hide_index=True)
             
             # Croisement Agences × Erreurs
             if 'Code_Unite' in df_clean.columns and 'Statut_Final' in df_clean.columns and ko_cnt>0:
                 st.markdown("### 🔀 Croisement Agences × Types d'Erreurs")
-                df_ko_cross = df_clean[df_clean['Statut_Final'].str.upper()!='OK']
                 try:
-                    cross = pd.crosstab(df_ko_cross['Code_Unite'], df_ko_cross['Statut_Final'], 
-                                       margins=True, margins_name='Total')
+                    cross = agg.crosstab('Code_Unite', 'Statut_Final', ko_only=True)
+                    cross = cross.loc[:, cross.sum() > 0]
+                    cross['Total'] = cross.sum(axis=1)
+                    cross.loc['Total'] = cross.sum()
                     st.dataframe(cross, width='stretch')
                 except:
                     st.warning("Impossible de générer le croisement")
         
         # TAB 5: VISUALISATIONS
-        with tab5:
+        with tab5, prof.stage('visualisations'):
             st.subheader("📈 Visualisations Interactives")
             
             c1,c2 = st.columns(2)
@@ -696,9 +585,8 @@ if uploaded:
             if 'Statut_Final' in df_clean.columns:
                 with c1:
                     st.markdown("#### Distribution OK vs KO")
-                    ok_v = len(df_clean[df_clean['Statut_Final'].str.upper()=='OK'])
-                    ko_v = len(df_clean) - ok_v
-                    fig = px.pie(values=[ok_v,ko_v], names=['OK','KO'],
+                    statuts = get_chart(ds_key, agg, 'statuts')
+                    fig = px.pie(values=statuts.values, names=statuts.index,
                                 title="Répartition Statut Final", hole=0.4,
                                 color_discrete_map={'OK':'#28a745','KO':'#dc3545'})
                     st.plotly_chart(fig, use_container_width=True)
@@ -707,7 +595,7 @@ if uploaded:
             if 'Type (libellé)' in df_clean.columns:
                 with c2:
                     st.markdown("#### Types de Contrats")
-                    types_v = df_clean['Type (libellé)'].value_counts()
+                    types_v = get_chart(ds_key, agg, 'comptages', (('col', 'Type (libellé)'),))
                     fig = px.bar(x=types_v.index, y=types_v.values,
                                 title="Nombre par Type", labels={'x':'Type','y':'Nombre'},
                                 color=types_v.values, color_continuous_scale='Blues')
@@ -720,7 +608,7 @@ if uploaded:
                 c1,c2 = st.columns(2)
                 
                 with c1:
-                    vol_ag = df_clean['Code_Unite'].value_counts().head(15)
+                    vol_ag = get_chart(ds_key, agg, 'comptages', (('col', 'Code_Unite'), ('n', 15)))
                     fig = px.bar(x=vol_ag.values, y=vol_ag.index, orientation='h',
                                 title="Top 15 Agences par Volume",
                                 labels={'x':'Contrats','y':'Agence'},
@@ -730,9 +618,7 @@ if uploaded:
                 
                 with c2:
                     if 'Statut_Final' in df_clean.columns:
-                        ag_succ = df_clean.groupby('Code_Unite')['Statut_Final'].apply(
-                            lambda x: (x.str.upper()=='OK').sum()/len(x)*100
-                        ).sort_values(ascending=False).head(15)
+                        ag_succ = get_chart(ds_key, agg, 'taux_agences', (('n', 15),))
                         
                         fig = px.bar(x=ag_succ.values, y=ag_succ.index, orientation='h',
                                     title="Top 15 Agences - Taux de Réussite",
@@ -744,11 +630,7 @@ if uploaded:
             # Timeline
             if 'Date_Integration' in df_clean.columns:
                 st.markdown("#### 📅 Évolution Temporelle")
-                df_time = df_clean.copy()
-                df_time['Date_Integration'] = pd.to_datetime(df_time['Date_Integration'], errors='coerce')
-                df_time = df_time.dropna(subset=['Date_Integration'])
-                df_time['Date'] = df_time['Date_Integration'].dt.date
-                timeline = df_time.groupby('Date').size().reset_index(name='Nombre')
+                timeline = get_chart(ds_key, agg, 'timeline')
                 
                 fig = px.line(timeline, x='Date', y='Nombre',
                              title="Volume de Contrats par Jour", markers=True)
@@ -758,7 +640,7 @@ if uploaded:
             if 'Type (libellé)' in df_clean.columns and 'Statut_Final' in df_clean.columns:
                 st.markdown("#### 🔀 Analyse Croisée Type × Statut")
                 try:
-                    cross_ts = pd.crosstab(df_clean['Type (libellé)'], df_clean['Statut_Final'])
+                    cross_ts = get_chart(ds_key, agg, 'croisement', (('a', 'Type (libellé)'), ('b', 'Statut_Final')))
                     fig = px.bar(cross_ts, barmode='group',
                                 title="Répartition des Statuts par Type de Contrat")
                     st.plotly_chart(fig, use_container_width=True)
@@ -767,13 +649,10 @@ if uploaded:
             
             # Heatmap Agences × Erreurs
             if 'Code_Unite' in df_clean.columns and 'Statut_Final' in df_clean.columns:
-                ko_heat = df_clean[df_clean['Statut_Final'].str.upper()!='OK']
-                if len(ko_heat)>0:
+                if agg.ko>0:
                     st.markdown("#### 🔥 Heatmap : Agences × Types d'Erreurs")
                     try:
-                        top_ag_ko = ko_heat['Code_Unite'].value_counts().head(10).index
-                        ko_heat_f = ko_heat[ko_heat['Code_Unite'].isin(top_ag_ko)]
-                        heatmap = pd.crosstab(ko_heat_f['Code_Unite'], ko_heat_f['Statut_Final'])
+                        heatmap = get_chart(ds_key, agg, 'heatmap_ko', (('n', 10),))
                         
                         fig = px.imshow(heatmap, labels=dict(x="Type d'erreur",y="Agence",color="Nombre"),
                                        title="Concentration des Erreurs (Top 10 Agences)",
@@ -783,7 +662,7 @@ if uploaded:
                         st.warning("Données insuffisantes pour la heatmap")
         
         # TAB 6: EXPORT EXCEL
-        with tab6:
+        with tab6, prof.stage('export'):
             st.subheader("💾 Télécharger l'Analyse Excel Complète")
             
             st.markdown("""
@@ -828,35 +707,101 @@ if uploaded:
             - 🏆 Classements et benchmarks
             """)
             
-            excel_file = create_excel(df_clean)
+            sel_sheets = st.multiselect("Onglets à inclure", list(EXCEL_SHEETS), list(EXCEL_SHEETS))
+            data_fmt = None
+            if 'Données nettoyées' in sel_sheets:
+                onglet1 = st.radio("Onglet 1 (données)", ["Copie dans le classeur", "Lien vers un fichier Parquet", "Lien vers un fichier CSV"], horizontal=True,
+                                   help="Les liens produisent une archive ZIP : rapport + fichier de données, bien plus rapide que la copie des lignes dans Excel")
+                data_fmt = {"Lien vers un fichier Parquet": 'Parquet', "Lien vers un fichier CSV": 'CSV'}.get(onglet1)
+            report_key = (ds_key, tuple(sel_sheets), data_fmt)
             
-            st.download_button(
-                label="⬇️ TÉLÉCHARGER L'ANALYSE COMPLÈTE (7 ONGLETS)",
-                data=excel_file,
-                file_name=f"analyse_complete_{datetime.now():%Y%m%d_%H%M%S}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
-            )
+            # Génération uniquement à la demande, puis servie depuis le cache
+            if st.button("⚙️ GÉNÉRER LE RAPPORT EXCEL", type="primary", disabled=not sel_sheets, use_container_width=True):
+                st.session_state.report_key = report_key
             
-            st.success("✅ Fichier Excel ultra-détaillé prêt au téléchargement !")
+            if st.session_state.get('report_key') == report_key:
+                # Construit en tâche de fond (partagée avec les autres sessions qui demandent le même rapport)
+                with prof.stage('rapport_excel'):
+                    df_ag = get_agency_metrics(ds_key, df_clean) if {'Code_Unite','Statut_Final'} <= set(df_clean.columns) else None
+                    job = start_job('rapport', ('rapport', *report_key), excel_report_job, df_clean, df_ag, tuple(sel_sheets), data_fmt)
+                    job.wait(JOB_INLINE_S)
+                
+                if job.status == DONE:
+                    st.download_button(
+                        label=f"⬇️ TÉLÉCHARGER L'ANALYSE COMPLÈTE ({len(sel_sheets)} ONGLETS{' + DONNÉES ' + data_fmt.upper() if data_fmt else ''})",
+                        data=job.result,
+                        file_name=f"analyse_complete_{datetime.now():%Y%m%d_%H%M%S}.{'zip' if data_fmt else 'xlsx'}",
+                        mime="application/zip" if data_fmt else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        use_container_width=True
+                    )
+                    
+                    st.success("✅ Fichier Excel ultra-détaillé prêt au téléchargement !")
+                elif not job.done:
+                    job_progress('rapport', "Génération du rapport Excel", reset='report_key')
+                else:
+                    st.error(f"❌ Génération interrompue : {job.error if job.status == FAILED else 'annulée'}")
+                    st.session_state.report_key = None
+                    stop_job('rapport')
+            else:
+                # Sélection modifiée (ou nouveau fichier) : la génération en cours n'est plus attendue
+                stop_job('rapport')
+                st.info("👆 Cliquez sur « Générer » pour construire le rapport (calculé une seule fois par fichier et sélection)")
             
             # Aperçu métriques
             st.markdown("### 📊 Aperçu des Métriques Clés")
             c1,c2,c3,c4 = st.columns(4)
             c1.metric("Total Contrats", len(df_clean))
             if 'Statut_Final' in df_clean.columns:
-                ok_pct = round(len(df_clean[df_clean['Statut_Final'].str.upper()=='OK'])/len(df_clean)*100,1)
+                ok_pct = round(agg.ok/agg.rows*100,1)
                 c2.metric("Taux Réussite", f"{ok_pct}%")
             if 'Code_Unite' in df_clean.columns:
                 c3.metric("Agences", df_clean['Code_Unite'].nunique())
             if 'Type (libellé)' in df_clean.columns:
                 c4.metric("Types", df_clean['Type (libellé)'].nunique())
+        
+        # TAB 7: RAPPROCHEMENT
+        with tab7, prof.stage('rapprochement'):
+            st.subheader("🔗 Rapprochement Excel × Pixid")
+            st.caption(f"Le fichier chargé ci-dessus sert de référence ({SIDES[0]}) ; les exports {SIDES[1]} sont rapprochés sur le numéro de contrat normalisé.")
+            
+            others = st.file_uploader("📁 Exports Pixid à rapprocher", type=['xlsx','xls'], accept_multiple_files=True, key="rapp_files")
+            c1,c2 = st.columns(2)
+            with c1:
+                use_fuzzy = st.checkbox("Repli flou pour les contrats sans correspondance exacte", value=True)
+            with c2:
+                seuil_flou = st.slider("Seuil de similarité (%)", 70, 100, FUZZY_THRESHOLD, disabled=not use_fuzzy)
+            
+            if others and 'Contrat' in df_clean.columns:
+                loaded = [load_dataset(u, all_cols) for u in others]
+                missing = [u.name for u,(_,_,d,_) in zip(others, loaded) if 'Contrat' not in d.columns]
+                if missing:
+                    st.warning(f"⚠️ Colonne 'Contrat' manquante dans : {', '.join(missing)} — export(s) ignoré(s) pour le rapprochement")
+                    loaded = [l for l in loaded if 'Contrat' in l[2].columns]
+                if loaded:
+                    res_r = get_reconciliation(ds_key, df_clean, tuple(k for k,_,_,_ in loaded), tuple(d for _,_,d,_ in loaded), use_fuzzy, seuil_flou)
+                
+                    cols = st.columns(5)
+                    for col,(lab,val) in zip(cols, res_r.stats().items()):
+                        col.metric(lab, f"{val:,}")
+                
+                    for titre,frame,nom in [("✅ Contrats appariés", res_r.matched, "apparies"),
+                                            (f"⬅️ Seulement dans {SIDES[0]}", res_r.left_only, "seulement_excel"),
+                                            (f"➡️ Seulement dans {SIDES[1]}", res_r.right_only, "seulement_pixid"),
+                                            ("⚠️ Écarts de valeurs", res_r.conflicts, "ecarts")]:
+                        with st.expander(f"{titre} ({len(frame):,})", expanded=False):
+                            st.dataframe(frame.head(1000), width='stretch', hide_index=True)
+                            export_buttons(frame, f"rapprochement_{nom}", f"rapp_{nom}")
+            elif 'Contrat' not in df_clean.columns:
+                st.warning("⚠️ Colonne 'Contrat' manquante dans le fichier de référence")
+            else:
+                st.info("👆 Ajoutez un ou plusieurs exports Pixid pour lancer le rapprochement")
     
     except Exception as e:
         st.error(f"❌ Erreur : {str(e)}")
         st.exception(e)
 
 else:
+    get_registry().attach(session_id(), [])
     st.info("👆 Uploadez un fichier Excel pour commencer")
     
     st.markdown("""
@@ -907,5 +852,33 @@ else:
     Optimisé pour **plusieurs dizaines de milliers de lignes**
     """)
 
+# ==================== REGISTRE (ADMINISTRATION) ====================
+with st.sidebar.expander("🗄️ Registre des jeux de données", expanded=False):
+    reg = get_registry()
+    resident = reg.report()
+    c1,c2 = st.columns(2)
+    c1.metric("En mémoire", f"{reg.size()/2**20:,.0f} Mo", f"budget {reg.max_bytes/2**20:,.0f} Mo", delta_color="off")
+    c2.metric("Sessions actives", len(reg.sessions))
+    st.caption(f"{reg.hits} hit(s) · {reg.misses} chargement(s) · {reg.evictions} éviction(s)")
+    if len(resident):
+        st.dataframe(resident, width='stretch', hide_index=True)
+    else:
+        st.caption("Aucun jeu de données en mémoire")
+    if st.button("🧹 Libérer les jeux inutilisés", disabled=not (resident['Sessions'] == 0).any(),
+                 help="Évince tout ce qu'aucune session n'utilise ; rechargé depuis l'instantané à la prochaine demande"):
+        reg.trim()
+        st.rerun()
+
+if prof.enabled:
+    prof.emit()
+    with st.sidebar:
+        st.markdown(f"**⏱️ Rerun : {prof.total_ms():,.0f} ms**")
+        if prof.records:
+            st.plotly_chart(waterfall(prof.records), use_container_width=True)
+            with st.expander("Détail (JSON)", expanded=False):
+                st.json(prof.records)
+        else:
+            st.caption("Aucune étape mesurée")
+
 st.markdown("---")
 st.markdown("<div style='text-align:center;color:#666;'>Excel Analyzer Pro v2.0 - Solution Complète</div>", unsafe_allow_html=True)
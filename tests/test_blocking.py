@@ -0,0 +1,33 @@
+"""Appariement par blocage : même rappel que la force brute, y compris aux scores arrondis vers le seuil"""
+import numpy as np
+import pytest
+
+from analyzer import BlockingConfig, fuzzy_join
+from analyzer.blocking import brute_force_join, synthetic_keys
+
+def _random_keys(n, seed):
+    # Longueurs et alphabets variés : clés courtes sans q-gramme commun, fautes multiples
+    rng = np.random.default_rng(seed)
+    base = [''.join(rng.choice(list('ABCDEFGH0123'), rng.integers(2, 14))) for _ in range(n)]
+    other = []
+    for k in base:
+        k = list(k)
+        for _ in range(rng.integers(0, 3)):
+            k[rng.integers(len(k))] = str(rng.choice(list('ABCDEFGH0123')))
+        other.append(''.join(k))
+    return base, other
+
+def _best(res):
+    return dict(zip(res['gauche'], res['score']))
+
+@pytest.mark.parametrize('threshold', [70, 75, 80, 85, 90, 95, 100])
+@pytest.mark.parametrize('q', [2, 3])
+def test_recall_matches_brute_force(threshold, q):
+    for left, right in (_random_keys(300, seed=threshold), synthetic_keys(300, typo_rate=0.6, seed=q)):
+        res, _ = fuzzy_join(left, right, BlockingConfig(threshold, q), workers=1)
+        assert _best(res) == _best(brute_force_join(left, right, threshold))
+
+def test_rounded_score_reaches_threshold():
+    # fuzz.ratio = 84,6 : arrondi à 85, la paire doit être retenue au seuil 85
+    res, _ = fuzzy_join(['ABCDEFGHIJKLM'], ['ABCDEFGHIJXYM', 'ZZZZZZZZZZZZZ'], BlockingConfig(85), workers=1)
+    assert res.to_dict('records') == [{'gauche': 'ABCDEFGHIJKLM', 'droite': 'ABCDEFGHIJXYM', 'score': 85}]
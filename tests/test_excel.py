@@ -0,0 +1,15 @@
+"""Rapport Excel : onglet 1 en lien vers le fichier de données"""
+import io
+
+import openpyxl
+import pytest
+
+from analyzer import create_excel, clean_data
+from analyzer.bench import synthetic_dataset
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['classique', 'flux'])
+def test_data_link_escapes_quotes(streaming):
+    df = clean_data(synthetic_dataset(50))
+    buf = create_excel(df, sheets=['Données nettoyées'], data_link='export "final".parquet', streaming=streaming)
+    cell = openpyxl.load_workbook(io.BytesIO(buf.getvalue()))['Données nettoyées']['B2']
+    assert cell.value == '=HYPERLINK("export ""final"".parquet","export ""final"".parquet")'
@@ -0,0 +1,28 @@
+"""Exports par paquets : une vue vide garde son en-tête, ses colonnes et reste un fichier lisible"""
+import gzip
+import io
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from analyzer import iter_frames, csv_chunks, parquet_chunks, xlsx_chunks
+
+@pytest.fixture
+def empty_view():
+    df = pd.DataFrame({'Contrat': ['C1', 'C2'], 'Code_Unite': ['AG1', 'AG2']})
+    return lambda: iter_frames(df, np.array([], dtype=int), {'Score': np.array([])})
+
+def test_empty_view_keeps_header(empty_view):
+    assert b''.join(csv_chunks(empty_view())) == b'Contrat,Code_Unite,Score\n'
+    assert gzip.decompress(b''.join(csv_chunks(empty_view(), compress=True))) == b'Contrat,Code_Unite,Score\n'
+    table = pq.read_table(io.BytesIO(b''.join(parquet_chunks(empty_view()))))
+    assert table.num_rows == 0 and table.column_names == ['Contrat', 'Code_Unite', 'Score']
+    wb = openpyxl.load_workbook(io.BytesIO(b''.join(xlsx_chunks(empty_view()))))
+    assert list(wb.active.values) == [('Contrat', 'Code_Unite', 'Score')]
+
+def test_no_frames_still_readable():
+    assert pq.read_table(io.BytesIO(b''.join(parquet_chunks(iter([]))))).num_rows == 0
+    assert openpyxl.load_workbook(io.BytesIO(b''.join(xlsx_chunks(iter([]))))).sheetnames == ['Données']
@@ -0,0 +1,48 @@
+"""Agrégats incrémentaux : mêmes résultats qu'un recalcul complet, agrégats d'origine intacts"""
+import numpy as np
+import pandas as pd
+
+from analyzer import Aggregates, clean_data, concat_clean
+from analyzer.bench import synthetic_dataset
+
+def _snapshot(agg):
+    return (agg.rows, agg.ok, agg.agency_metrics().to_dict('list'), agg.counts('Statut_Final').to_dict(),
+            agg.errors.to_dict(), agg.agency_errors.to_dict(), agg.crosstab('Code_Unite', 'Statut_Final').to_dict(),
+            int(agg.cube.counts.sum()), int(sum(len(r) for r in agg.key_runs)))
+
+def test_deltas_match_full_rebuild():
+    full = clean_data(synthetic_dataset(3000, seed=1))
+    agg = Aggregates.from_frame(full.iloc[:1000])
+    df = full.iloc[:1000]
+    for start in range(1000, 3000, 250):
+        # Chaque delta recouvre en partie le précédent : les lignes déjà vues sont ignorées
+        delta = full.iloc[start - 100:start + 250]
+        new = agg.new_rows(delta)
+        assert len(new) == len(delta) - 100
+        before = _snapshot(agg)
+        nxt = agg.plus(new)
+        assert _snapshot(agg) == before
+        agg, df = nxt, concat_clean(df, new)
+    assert len(agg.key_runs) <= int(np.log2(len(df))) + 1
+    assert all((np.diff(r) > 0).all() for r in agg.key_runs)
+    assert _snapshot(agg) == _snapshot(Aggregates.from_frame(df))
+
+def test_new_rows_dedupes_within_delta():
+    df = clean_data(synthetic_dataset(200, seed=2))
+    agg = Aggregates.from_frame(df.iloc[:100])
+    delta = pd.concat([df.iloc[50:150], df.iloc[120:150]])
+    assert len(agg.new_rows(delta)) == 50
+    assert len(Aggregates().new_rows(df.iloc[:10])) == 10
+
+def test_concat_keeps_base_dtypes():
+    base = clean_data(pd.DataFrame({'Contrat': [f'C{i}' for i in range(100)], 'Statut_Final': ['OK', 'KO'] * 50}))
+    delta = clean_data(pd.DataFrame({'Contrat': ['C1000'] * 4, 'Statut_Final': ['OK'] * 4}))
+    assert isinstance(delta['Contrat'].dtype, pd.CategoricalDtype)
+    out = concat_clean(base, delta)
+    # Le delta catégoriel ne rend pas catégorielle la colonne à forte cardinalité de la base
+    assert out['Contrat'].dtype == base['Contrat'].dtype and out['Contrat'].iloc[-1] == 'C1000'
+    assert isinstance(out['Statut_Final'].dtype, pd.CategoricalDtype)
+    # Base catégorielle que la fusion rend trop variée : repasse en texte
+    many = clean_data(pd.DataFrame({'Contrat': [f'D{i}' for i in range(200)], 'Statut_Final': ['OK'] * 200}))
+    out = concat_clean(delta, many)
+    assert not isinstance(out['Contrat'].dtype, pd.CategoricalDtype) and len(out) == 204
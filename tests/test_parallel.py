@@ -0,0 +1,30 @@
+"""map_chunks en série : chaque appel voit son propre état, même avec des appels concurrents"""
+import threading
+import time
+
+from analyzer.parallel import map_chunks, worker_state
+
+def _tag_chunk(items):
+    time.sleep(0.01)
+    return [(worker_state()['tag'], x) for x in items]
+
+def test_serial_state_is_per_call():
+    results, errors = {}, []
+    def run(tag):
+        try:
+            parts = map_chunks(_tag_chunk, list(range(40)), {'tag': tag}, workers=1, chunk_size=4)
+            results[tag] = [t for part in parts for t, _ in part]
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(tag,)) for tag in 'abcd']
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert not errors
+    assert all(tags == [tag] * 40 for tag, tags in results.items()) and len(results) == 4
+    assert 'tag' not in worker_state()
+
+def test_serial_state_nested():
+    def outer(items):
+        inner = map_chunks(_tag_chunk, items, {'tag': 'interne'}, workers=1)
+        return worker_state()['tag'], inner[0][0][0]
+    assert map_chunks(outer, [1, 2], {'tag': 'externe'}, workers=1) == [('externe', 'interne')]
@@ -0,0 +1,54 @@
+"""Pic mémoire par étape : propre à chaque étape malgré les étapes imbriquées ou concurrentes"""
+import threading
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from analyzer.profiling import Profiler, memory_tracing
+
+@pytest.fixture
+def tracing():
+    started = memory_tracing()
+    yield
+    if started: tracemalloc.stop()
+
+def _alloc(mb):
+    a = np.ones(mb * 2**20, dtype=np.uint8)
+    del a
+
+def test_nested_stage_keeps_outer_peak(tracing):
+    prof = Profiler(True)
+    with prof.stage('externe'):
+        _alloc(40)
+        with prof.stage('interne'):
+            _alloc(5)
+    peaks = {r['etape']: r['pic_alloc_mo'] for r in prof.records}
+    assert 4.5 <= peaks['interne'] < 10
+    assert peaks['externe'] >= 39
+
+def test_concurrent_stages(tracing):
+    started, release = threading.Barrier(2), threading.Event()
+    gros = Profiler(True)
+    def run():
+        with gros.stage('gros'):
+            _alloc(30)
+            started.wait()
+            release.wait()
+    t = threading.Thread(target=run)
+    t.start()
+    started.wait()
+    # Une autre session démarre et finit ses étapes pendant que 'gros' est en cours
+    petit = Profiler(True)
+    with petit.stage('petit'):
+        _alloc(2)
+    release.set()
+    t.join()
+    assert gros.records[0]['pic_alloc_mo'] >= 29
+    assert petit.records[0]['pic_alloc_mo'] < 10
+
+def test_profilers_never_stop_tracing(tracing):
+    Profiler(False)
+    Profiler(True)
+    assert tracemalloc.is_tracing()
+    assert not memory_tracing()
@@ -0,0 +1,35 @@
+"""Lecture des classeurs : mêmes données quel que soit le moteur"""
+import datetime as dt
+import io
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from analyzer import read_workbook, clean_data
+from analyzer.reader import HAS_CALAMINE
+
+def _workbook():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Contrat', 'Code_Unite', 'Statut_Final', 'Date_Integration', 'Heure', 'Duree', 'Montant'])
+    ws.append(['C1', 'AG001', 'OK', dt.datetime(2024, 3, 5, 10, 30), dt.time(8, 15), dt.timedelta(hours=30), 1.0])
+    # Date sans heure : calamine la renvoie en datetime.date
+    ws.append(['C2', 'AG002', 'KO', dt.date(2024, 3, 6), dt.time(9, 0), dt.timedelta(minutes=5), 2.5])
+    ws.append([1234, 'AG001', 'OK', None, None, None, None])
+    ws.append(['C4', '', 'KO', dt.datetime(2024, 4, 1), dt.time(0, 0), dt.timedelta(0), 3])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+@pytest.mark.skipif(not HAS_CALAMINE, reason="python-calamine non installé")
+def test_engine_parity():
+    data = _workbook()
+    cal = read_workbook(data, None, engine='calamine')
+    opx = read_workbook(data, None, engine='openpyxl')
+    pd.testing.assert_frame_equal(cal, opx)
+    assert pd.api.types.is_datetime64_any_dtype(cal['Date_Integration'])
+    assert pd.api.types.is_timedelta64_dtype(cal['Duree'])
+    ref = pd.read_excel(io.BytesIO(data), engine='calamine')
+    assert cal.dtypes.to_dict() == ref.dtypes.to_dict()
+    pd.testing.assert_frame_equal(clean_data(cal), clean_data(opx))
@@ -0,0 +1,41 @@
+"""Parité entre calc_scores (vectorisé) et calc_score appliqué ligne par ligne"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import calc_score, calc_scores, clean_data
+
+def _frame():
+    rng = np.random.default_rng(0)
+    n = 300
+    return pd.DataFrame({
+        'Contrat': [f"C{rng.integers(1000, 99999)}" for _ in range(n - 3)] + ['AB-12', None, ''],
+        'Code_Unite': rng.choice(['AG001', 'AG002', 'NVM'], n),
+        'Statut_Final': rng.choice(['OK', 'ok', 'KO', 'Erreur', None], n),
+        'Date_Integration': rng.choice(['15/01/2024', '03/09/2024', '2024-09-20', 'pas une date', None], n),
+    })
+
+FILTERS = [{}, {'agence': 'AG001'}, {'agence': 'ABSENTE'}, {'statut': 'OK'}, {'statut': 'KO'},
+           {'mois': 9}, {'mois': 1}, {'agence': 'NVM', 'statut': 'KO', 'mois': 9}]
+# Sous-chaînes présentes ou non, requêtes vides ou très courtes
+QUERIES = ['C1', 'ab-12', 'c', '', ' ', 'zzz', '99999', 'AB-12 X']
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('clean', [False, True], ids=['brut', 'nettoye'])
+def test_calc_scores_parity(query, filters, clean):
+    df = _frame()
+    if clean: df = clean_data(df)
+    expected = df.apply(calc_score, axis=1, args=(query, filters)).astype(float)
+    pd.testing.assert_series_equal(calc_scores(df, query, filters), expected, check_names=False)
+
+def test_calc_scores_chunked():
+    df = _frame()
+    seen = []
+    got = calc_scores(df, 'C1', {'statut': 'KO'}, progress=lambda n, total: seen.append(n), chunk_rows=70)
+    pd.testing.assert_series_equal(got, calc_scores(df, 'C1', {'statut': 'KO'}))
+    assert seen == [70, 140, 210, 280, 300]
+
+def test_calc_scores_without_columns():
+    df = pd.DataFrame({'Autre': [1, 2]})
+    assert calc_scores(df, 'x', {'agence': 'AG001', 'statut': 'OK', 'mois': 1}).tolist() == [0.0, 0.0]
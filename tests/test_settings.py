@@ -0,0 +1,17 @@
+"""Réglages numériques de l'environnement"""
+import pytest
+
+from analyzer.settings import env_number, env_mb
+
+@pytest.mark.parametrize('raw, expected', [(None, 2048 * 2**20), ('', 2048 * 2**20), ('  ', 2048 * 2**20), ('512', 512 * 2**20),
+                                           ('1.5', int(1.5 * 2**20)), ('1,5', int(1.5 * 2**20)), ('abc', 2048 * 2**20),
+                                           ('-3', 2048 * 2**20), ('0', 2048 * 2**20), ('nan', 2048 * 2**20)])
+def test_env_mb(monkeypatch, raw, expected):
+    if raw is None: monkeypatch.delenv('ANALYZER_TEST_MB', raising=False)
+    else: monkeypatch.setenv('ANALYZER_TEST_MB', raw)
+    assert env_mb('ANALYZER_TEST_MB', 2048) == expected
+
+@pytest.mark.parametrize('raw, expected', [('4', 4), ('2.7', 2), ('0.5', 3), ('inf', 3), ('x', 3)])
+def test_env_number_int(monkeypatch, raw, expected):
+    monkeypatch.setenv('ANALYZER_TEST_N', raw)
+    assert env_number('ANALYZER_TEST_N', 3, int) == expected